@@ -0,0 +1,877 @@
+import argparse
+import dataclasses
+import importlib
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from math import ceil
+from typing import Any, Callable
+
+# the engine only ships inside the launcher, so it has to win over the stub `game` package in this directory
+LAUNCHER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'launcher.pyz')
+if LAUNCHER_PATH not in sys.path:
+    sys.path.insert(0, LAUNCHER_PATH)
+
+import game.common.game_object
+from game.common.game_object import GameObject
+from game.common.map.game_board import GameBoard
+from game.common.map.wall import Wall
+from game.common.player import Player
+from game.common.stations.refuge import Refuge
+from game.config import *
+from game.controllers.master_controller import MasterController
+from game.engine import Engine
+from game.fnaacm.bots.bot import Bot
+from game.utils.thread import CommunicationThread
+from game.utils.validation import verify_code, verify_num_clients
+from map_cache import load_map
+from profiler import PhaseProfiler, format_summary, merge_profiles, profile_summary
+from turn_log import COMPRESSIONS, DEFAULT_KEYFRAME_INTERVAL, TurnLogWriter, coordinate_key
+
+
+class GameIds:
+    """
+    `Game Ids Notes:`
+
+        Stands in for the ``uuid`` module in ``game.common.game_object``, so ``GameObject`` gets its id from a counter
+        instead of ``uuid.uuid4()``. Ids are small numbers (as strings, like before), they cost an add instead of a
+        call for random bytes, and since the counter starts over with every game they are the same every time a seed
+        is played, which keeps results and turn logs comparable across runs.
+
+        Only the engine's objects are counted: the engine runs on the main thread, and objects made on any other
+        thread (a client's turns run on a ClientWorker thread) get a random uuid like before. That way what a client
+        makes, or a client left running after it timed out, never shifts the ids of the engine's objects.
+    """
+
+    def __init__(self):
+        self.last_id: int = 0
+
+    def uuid4(self) -> int | uuid.UUID:
+        # GameObject calls str() on this
+        if threading.current_thread() is not threading.main_thread():
+            return uuid.uuid4()
+        self.last_id += 1
+        return self.last_id
+
+
+GAME_IDS = GameIds()
+game.common.game_object.uuid = GAME_IDS
+
+
+def build_game_board(seed: int) -> GameBoard:
+    """
+    Does the same work as ``generate_game.generate`` without writing ``game_map.json``. The board is serialized and
+    loaded back in memory so the engine starts from exactly what ``Engine.load`` would have read from disk.
+    """
+    # every game counts its ids from the start, including the ones the generated board is saved with
+    GAME_IDS.last_id = 0
+    # the map is parsed once and compiled, and every game after that unpickles a fresh copy of it
+    locations, map_size = load_map()
+
+    generated: GameBoard = GameBoard(seed, map_size, locations, True)
+    generated.generate_map()
+    data: dict = generated.to_json()
+
+    # every game normally runs in a fresh process; reset the class-level state a previous game (or the generation
+    # above) left behind before loading the board the engine will actually use
+    reset_global_state()
+    return GameBoard().from_json(data)
+
+
+def reset_global_state() -> None:
+    Bot.reset_global_state()
+    Refuge.reset_global_state()
+    Refuge.all_positions.clear()
+
+
+def get_global_state() -> dict:
+    """
+    Returns the state the game keeps outside of the board: the class-level state of Bot and Refuge, the state of
+    ``random`` and the last id given out. Together with the world and the master controller, this is everything a
+    game needs to carry on.
+    """
+    return {
+        'bot_global_stun_turns_remaining': Bot.global_stun_turns_remaining,
+        'refuge_global_occupied': Refuge.global_occupied,
+        'refuge_global_turns_inside': Refuge.global_turns_inside,
+        'refuge_global_turns_outside': Refuge.global_turns_outside,
+        'refuge_all_positions': set(Refuge.all_positions),
+        'random_state': random.getstate(),
+        'last_id': GAME_IDS.last_id,
+    }
+
+
+def set_global_state(state: dict) -> None:
+    """
+    Puts back state returned by ``get_global_state``.
+    """
+    Bot.global_stun_turns_remaining = state['bot_global_stun_turns_remaining']
+    Refuge.global_occupied = state['refuge_global_occupied']
+    Refuge.global_turns_inside = state['refuge_global_turns_inside']
+    Refuge.global_turns_outside = state['refuge_global_turns_outside']
+    Refuge.all_positions.clear()
+    Refuge.all_positions.update(state['refuge_all_positions'])
+    random.setstate(state['random_state'])
+    GAME_IDS.last_id = state['last_id']
+
+
+def board_to_json(board: GameBoard) -> dict:
+    """
+    The same JSON as ``GameBoard.to_json``, except that the tiles and generators are keyed by ``coordinate_key``
+    ("x,y") instead of a stringified Vector. Turning every Vector into a dict and then a string is a good part of the
+    time ``to_json`` takes.
+    """
+    data = GameObject.to_json(board)
+    data['game_map'] = {coordinate_key(vec.x, vec.y): container.to_json()
+                        for vec, container in board.game_map.items()} if board.game_map is not None else None
+    data['seed'] = board.seed
+    data['map_size'] = board.map_size.to_json()
+    data['walled'] = board.walled
+    data['event_active'] = board.event_active
+    data['generators'] = {coordinate_key(pos.x, pos.y): generator.to_json()
+                          for pos, generator in board.generators.items()}
+    data['battery_spawners'] = board.battery_spawners.to_json()
+    data['scrap_spawners'] = board.scrap_spawners.to_json()
+    data['coin_spawners'] = board.coin_spawners.to_json()
+    return data
+
+
+def snapshot[T](obj: T) -> T:
+    """
+    Returns a copy of ``obj`` that shares nothing with it, like ``deepcopy`` does. Pickling walks the object graph in C,
+    which makes copying the whole game board several times faster than ``deepcopy``.
+    """
+    return pickle.loads(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+
+def wall_layer(board: GameBoard) -> tuple[dict[int, int], bytes]:
+    """
+    Pickles the containers on the board that only hold walls, which stay the same for the whole game, once, for
+    ``snapshot_board`` to unpickle a fresh copy of every turn.
+    :return: the place of every wall container in the pickled list, by the ``id`` of the container on the board, and
+        the pickle
+    """
+    walls = [container for container in board.game_map.values()
+             if any(True for _ in container) and all(type(game_object) is Wall for game_object in container)]
+    return {id(container): index for index, container in enumerate(walls)}, pickle.dumps(walls, pickle.HIGHEST_PROTOCOL)
+
+
+def snapshot_board(board: GameBoard, walls: tuple[dict[int, int], bytes]) -> GameBoard:
+    """
+    Same as ``snapshot(board)``, except that the wall containers (see ``wall_layer``) are left out of the pickle, and
+    the copy gets new ones unpickled from the wall layer in their place. The walls are a good part of the board and
+    the same every turn, so only loading them is left to do.
+    """
+    indices, wall_data = walls
+    game_map = board.game_map
+    # the positions are copied with the rest of the board, so objects that hold one of them still share it
+    tiles = [(position, None if id(container) in indices else container) for position, container in game_map.items()]
+    board.game_map = None
+    try:
+        copy, copied_tiles = snapshot((board, tiles))
+    finally:
+        board.game_map = game_map
+    wall_containers = pickle.loads(wall_data)
+    copy.game_map = {position: wall_containers[indices[id(original)]] if container is None else container
+                     for (position, container), original in zip(copied_tiles, game_map.values())}
+    return copy
+
+
+class BatchMasterController(MasterController):
+    """
+    `Batch Master Controller Notes:`
+
+        Gives the client its copies of the world and avatar through ``snapshot`` instead of ``deepcopy``. The client
+        still can't reach the real game state through them, so games play out exactly the same way. The containers
+        that only hold walls are pickled once per game (``wall_layer``), so every turn they only have to be loaded
+        again, not pickled.
+
+        The turns counted by ``game_loop_logic`` start at ``start_turn`` instead of always at 1, so a game restored
+        from a saved state carries on from the turn after it. A game saved on the tick it ended has no turns left.
+
+        The bots are looked up on the board once instead of every turn; they stay on the board for the whole game, so
+        the cached ones are always the ones on the board.
+
+        Turn logs are created with ``board_to_json``, so their positions have compact "x,y" keys.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.start_turn: int = 1
+        self.walls: tuple[dict[int, int], bytes] | None = None
+
+    def __getstate__(self):
+        # the wall layer is keyed by the ids of this process's containers, so a restored game pickles its own
+        state = self.__dict__.copy()
+        state['walls'] = None
+        return state
+
+    def game_loop_logic(self, start=None):
+        start = self.start_turn if start is None else start
+        if self.game_over or start > MAX_TICKS:
+            return iter(())
+        return super().game_loop_logic(start)
+
+    def interpret_current_turn_data(self, clients: list[Player], world: dict, turn):
+        if world is not self.current_world_data or not self.bots:
+            super().interpret_current_turn_data(clients, world, turn)
+        elif turn == 1:
+            random.seed(world['game_board'].seed)
+
+    def create_turn_log(self, clients: list[Player], turn: int):
+        data = dict()
+        data['tick'] = turn
+        data['clients'] = [client.to_json() for client in clients]
+        data['game_board'] = board_to_json(self.current_world_data['game_board'])
+        data['point_data'] = dataclasses.asdict(self.point_data)
+        data['points_awarded'] = self.point_data.point_award
+        return data
+
+    def client_turn_arguments(self, client: Player, turn):
+        client.actions = []
+
+        # the board and avatar are copied separately, same as the engine does
+        board = self.current_world_data['game_board']
+        if self.walls is None:
+            self.walls = wall_layer(board)
+        current_world = snapshot_board(board, self.walls)
+        copy_avatar = snapshot(client.avatar)
+        args = (self.turn, current_world, copy_avatar)
+        return args
+
+
+STATE_VERSION = 3
+
+# how long a client's thread gets to finish once its game is over
+CLIENT_STOP_SECONDS = 0.1
+
+
+def save_state(path: str, engine: 'BatchEngine') -> None:
+    """
+    Pickles everything the game needs to carry on from the end of the engine's current tick: the world, the master
+    controller (with its controllers, timers and bot cache), the players and their avatars, the class-level state of
+    Bot and Refuge, and the state of ``random``. Everything goes into one pickle, so the objects that are shared between
+    them (the avatar on the board and the one the player holds, the cached bots) are still shared when loaded.
+
+    The players' client code isn't saved; a restored game starts a new instance of the client.
+    """
+    codes = [client.code for client in engine.clients]
+    for client in engine.clients:
+        client.code = None
+
+    state = {
+        'version': STATE_VERSION,
+        'seed': engine.seed,
+        'tick': engine.tick_number,
+        'world': engine.world,
+        'master_controller': engine.master_controller,
+        'clients': engine.clients,
+        'global_state': get_global_state(),
+    }
+    try:
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    finally:
+        for client, code in zip(engine.clients, codes):
+            client.code = code
+
+
+def load_state(path: str) -> dict:
+    """
+    Loads a state written by ``save_state`` and puts the class-level state of Bot and Refuge and the state of
+    ``random`` back the way they were when it was saved.
+    :return: the saved state
+    """
+    with open(path, 'rb') as f:
+        state: dict = pickle.load(f)
+
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f'{path} was saved by a different version of the batch runner and can\'t be loaded.')
+
+    set_global_state(state['global_state'])
+    return state
+
+
+def state_path(state_dir: str, seed: int, tick: int) -> str:
+    return os.path.join(state_dir, f'seed_{seed}_tick_{tick:04d}.state')
+
+
+class ClientWorker:
+    """
+    `Client Worker Notes:`
+
+        A thread that lives for the whole game and runs a client's ``take_turn`` every time turn arguments are
+        submitted, instead of a new Thread per turn. The time each call takes is measured around the call itself with
+        ``time.perf_counter_ns`` and kept in ``latencies_ns``. A turn the client didn't reply to in time is kept as the
+        time that was waited for it, since how long it really takes is never known.
+
+        A client that doesn't reply in time is dropped by the engine, so a worker that times out is never submitted to
+        again. Its thread can't be stopped from the outside, though, and keeps running the client's code for as long
+        as that takes; ``join`` tells whether it's still running once the game is over.
+    """
+
+    def __init__(self, func: Callable[..., Any]):
+        self.func: Callable[..., Any] = func
+        self.latencies_ns: list[int] = []
+        self.__submitted_ns: int = 0
+        self.__turns: queue.Queue[tuple | None] = queue.Queue(maxsize=1)
+        self.__replies: queue.Queue[tuple[Any, str | None, int]] = queue.Queue(maxsize=1)
+        self.__thread = threading.Thread(target=self.__run, name='ClientWorker', daemon=True)
+        self.__thread.start()
+
+    def submit(self, args: tuple) -> None:
+        self.__submitted_ns = time.perf_counter_ns()
+        self.__turns.put(args)
+
+    def wait(self, timeout: float) -> tuple[bool, Any, str | None]:
+        """
+        Waits up to ``timeout`` seconds for the turn submitted last.
+        :return: whether the client replied in time, what it returned, and the traceback if it raised an error
+        """
+        try:
+            result, error, latency_ns = self.__replies.get(timeout=timeout)
+        except queue.Empty:
+            self.latencies_ns.append(time.perf_counter_ns() - self.__submitted_ns)
+            return False, None, None
+        self.latencies_ns.append(latency_ns)
+        return True, result, error
+
+    def stop(self) -> None:
+        self.__turns.put(None)
+
+    def join(self, timeout: float) -> bool:
+        """
+        Waits up to ``timeout`` seconds for the thread to finish after ``stop``.
+        :return: whether it's still running
+        """
+        self.__thread.join(timeout)
+        return self.__thread.is_alive()
+
+    def __run(self) -> None:
+        while (args := self.__turns.get()) is not None:
+            result, error = None, None
+            start = time.perf_counter_ns()
+            try:
+                result = self.func(*args)
+            except Exception:
+                error = traceback.format_exc()
+            self.__replies.put((result, error, time.perf_counter_ns() - start))
+
+
+def latency_stats(latencies_ns: list[int]) -> dict:
+    """
+    p50/p95/max (nearest rank) of the given turn latencies, in milliseconds
+    """
+    if not latencies_ns:
+        return {'turns': 0, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+
+    ordered = sorted(latencies_ns)
+    percentile = lambda p: ordered[max(0, ceil(p * len(ordered)) - 1)] / 1e6
+    return {'turns': len(ordered), 'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95),
+            'max_ms': ordered[-1] / 1e6}
+
+
+class BatchEngine(Engine):
+    """
+    `Batch Engine Notes:`
+
+        An Engine that runs one game entirely in memory. The game board comes from ``build_game_board`` instead of
+        ``logs/game_map.json``, the client is an already imported module instead of a file found in
+        CLIENT_DIRECTORY, and the results are kept on ``self.results`` instead of being written to ``results.json``.
+        Clients get their copy of the world from ``BatchMasterController``.
+
+        Each client's turns run on a ClientWorker. The turn time limit is enforced against ``time.perf_counter_ns``,
+        and the p50/p95/max time the client took per turn is added to its entry in the results as ``turn_latency``.
+
+        Turn logs are only written when ``turn_log_path`` is given, and then all of them go into one file through a
+        TurnLogWriter instead of a file (and a thread) per turn.
+
+        With ``profile`` set, the wall time of every phase of a tick (the spawners, each controller, creating the turn
+        log, copying the world for the client and the client's own turn) is added up by a PhaseProfiler and stored in
+        the results as ``profile``.
+
+        The state of the game is saved (see ``save_state``) at the end of every tick in ``save_ticks`` into
+        ``state_dir``. Given ``resume_from``, the game is loaded from such a state instead of being generated, and
+        plays on from the tick after the one it was saved at; ``seed`` is then taken from the state.
+
+        Shutting down never exits the process, so the same worker can keep running games. If a client's thread is
+        still running after the game (it timed out and hasn't returned since), ``client_left_running`` is set, and
+        ``run_batch`` retires the worker process instead of running more games next to it.
+    """
+
+    def __init__(self, seed: int | None, client_module, client_error: str | None = None,
+                 turn_log_path: str | None = None, compression: str = 'none',
+                 keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL, profile: bool = False,
+                 save_ticks: list[int] | None = None, state_dir: str | None = None, resume_from: str | None = None):
+        super().__init__(quiet_mode=False)
+        self.master_controller = BatchMasterController()
+        self.seed: int | None = seed
+        self.client_module = client_module
+        self.client_error: str | None = client_error
+        self.turn_log_path: str | None = turn_log_path
+        self.compression: str = compression
+        self.keyframe_interval: int = keyframe_interval
+        self.turn_log: TurnLogWriter | None = None
+        self.client_workers: dict[str, ClientWorker] = {}
+        self.profiler: PhaseProfiler | None = PhaseProfiler() if profile else None
+        self.save_ticks: set[int] = set(save_ticks or [])
+        self.state_dir: str | None = state_dir
+        self.resume_from: str | None = resume_from
+        self.results: dict | None = None
+        self.client_left_running: bool = False
+
+    def load(self):
+        if self.resume_from is not None:
+            state = load_state(self.resume_from)
+            self.seed = state['seed']
+            self.tick_number = state['tick']
+            self.world = state['world']
+            self.master_controller = state['master_controller']
+            self.master_controller.start_turn = self.tick_number + 1
+            self.clients = state['clients']
+        else:
+            self.world = {'game_board': build_game_board(self.seed)}
+
+        if self.turn_log_path is not None:
+            self.turn_log = TurnLogWriter(self.turn_log_path, self.compression,
+                                          keyframe_interval=self.keyframe_interval)
+        if self.profiler is not None:
+            self.install_profiler()
+
+    def install_profiler(self):
+        game_board: GameBoard = self.world['game_board']
+        master_controller = self.master_controller
+        profiler = self.profiler
+
+        # spawners are copied to the client with the board every turn, so their class is wrapped instead of them
+        spawners = [*game_board.battery_spawners, *game_board.scrap_spawners, *game_board.coin_spawners]
+        for spawner_class in {type(spawner) for spawner in spawners}:
+            profiler.wrap(spawner_class, 'tick', 'spawners')
+
+        phases = [
+            (master_controller.movement_controller, 'handle_actions', 'MovementController'),
+            (master_controller.interact_controller, 'handle_actions', 'InteractController'),
+            (master_controller.interact_controller, 'handle_implicit_interactions', 'InteractController'),
+            (master_controller.refuge_controller, 'handle_actions', 'RefugeController'),
+            (master_controller.boosting_controller, 'boosting', 'BoostingController'),
+            (master_controller.bot_vision_controller, 'handle_actions', 'BotVisionController'),
+            (master_controller.bot_movement_controller, 'calc_next_moves', 'BotMovementController.calc_next_moves'),
+            (master_controller.bot_movement_controller, 'handle_actions', 'BotMovementController.handle_actions'),
+            (master_controller.bot_attack_controller, 'calculate_attack_action', 'Attack_Controller'),
+            (master_controller.bot_attack_controller, 'handle_actions', 'Attack_Controller'),
+            (master_controller.power_controller, 'handle_actions', 'PowerController'),
+            (master_controller.point_controller, 'handle_actions', 'PointController'),
+            (master_controller, 'create_turn_log', 'create_turn_log'),
+            (master_controller, 'client_turn_arguments', 'client copy'),
+        ]
+        for owner, name, phase in phases:
+            profiler.wrap(owner, name, phase)
+
+    def boot(self):
+        # a restored game already has its player, avatar included
+        restored = len(self.clients) > 0
+        if not restored:
+            self.clients.append(Player())
+        player = self.clients[0]
+
+        if self.client_error is not None:
+            player.functional = False
+            player.error = self.client_error
+        else:
+            player.file_name = self.client_module.__name__
+            try:
+                player.code = self.client_module.Client()
+                thr = CommunicationThread(player.code.team_name, list(), str)
+                thr.start()
+                thr.join(0.01)  # Shouldn't take long to get a string
+
+                if thr.is_alive():
+                    player.functional = False
+                    player.error = 'Client failed to provide a team name in time.'
+                elif thr.error is not None:
+                    player.functional = False
+                    player.error = str(thr.error)
+                player.team_name = thr.retrieve_value()
+            except Exception:
+                player.functional = False
+                player.error = str(traceback.format_exc())
+
+        func_clients = [client for client in self.clients if client.functional]
+        client_num_correct = verify_num_clients(func_clients,
+                                                SET_NUMBER_OF_CLIENTS_START,
+                                                MIN_CLIENTS_START,
+                                                MAX_CLIENTS_START)
+        if client_num_correct is not None:
+            self.shutdown(source=f'Client_error ({client_num_correct})')
+            # Engine.loop has nothing to stop on before the first tick; it catches this and calls shutdown again
+            raise RuntimeError(self.results['reason'])
+
+        if not restored:
+            self.master_controller.give_clients_objects(self.clients[:1], self.world)
+
+    def tick(self):
+        waiting: list[tuple[Player, ClientWorker]] = []
+        for client in self.clients:
+            # Skip non-functional clients
+            if not client.functional:
+                continue
+
+            arguments = self.master_controller.client_turn_arguments(client, self.tick_number)
+            if client.id not in self.client_workers:
+                self.client_workers[client.id] = ClientWorker(client.code.take_turn)
+            worker = self.client_workers[client.id]
+            worker.submit(arguments)
+            waiting.append((client, worker))
+
+        # every client gets MAX_SECONDS_PER_TURN from the moment the turns were handed out, however many there are
+        handed_out = time.perf_counter_ns()
+        deadline = handed_out + int(MAX_SECONDS_PER_TURN * 1e9)
+        for client, worker in waiting:
+            replied, result, error = worker.wait(max(0, deadline - time.perf_counter_ns()) / 1e9)
+            client.actions = result if result is not None else []
+
+            if not replied:
+                client.functional = False
+                client.error = f'{client.id} failed to reply in time and has been dropped.'
+                print(client.error)
+
+            if error is not None:
+                client.functional = False
+                client.error = error
+                print(error)
+
+        if self.profiler is not None and waiting:
+            self.profiler.add('client turn', time.perf_counter_ns() - handed_out)
+
+        # Verify there are enough clients to continue the game
+        func_clients = [client for client in self.clients if client.functional]
+        client_num_correct = verify_num_clients(func_clients,
+                                                SET_NUMBER_OF_CLIENTS_CONTINUE,
+                                                MIN_CLIENTS_CONTINUE,
+                                                MAX_CLIENTS_CONTINUE)
+        if client_num_correct is not None:
+            self.shutdown(source=f'Client_error ({client_num_correct})')
+
+        if self.profiler is None:
+            self.master_controller.turn_logic(self.clients, self.tick_number)
+            return
+
+        # whatever turn_logic spends outside of the wrapped controllers is counted as its own phase
+        inner_phases = ('spawners', 'MovementController', 'InteractController', 'RefugeController',
+                        'BoostingController', 'BotVisionController', 'BotMovementController.calc_next_moves',
+                        'BotMovementController.handle_actions', 'Attack_Controller', 'PowerController',
+                        'PointController')
+        inner_before = sum(self.profiler.total_ns.get(phase, 0) for phase in inner_phases)
+        start = time.perf_counter_ns()
+        self.master_controller.turn_logic(self.clients, self.tick_number)
+        elapsed = time.perf_counter_ns() - start
+        inner = sum(self.profiler.total_ns.get(phase, 0) for phase in inner_phases) - inner_before
+        self.profiler.add('turn_logic (other)', elapsed - inner)
+
+    def post_tick(self):
+        # the turn log is always created since serializing a bot updates the state the client sees next turn
+        data = self.master_controller.create_turn_log(self.clients, self.tick_number)
+
+        # nothing is logged after shutdown, same as the engine exiting there
+        if self.turn_log is not None and self.results is None:
+            self.turn_log.write(self.tick_number, data)
+
+        if self.tick_number in self.save_ticks and self.results is None:
+            # the wrapped methods can't be pickled; put the real ones back while saving
+            if self.profiler is not None:
+                self.profiler.restore()
+            save_state(state_path(self.state_dir, self.seed, self.tick_number), self)
+            if self.profiler is not None:
+                self.install_profiler()
+
+    def shutdown(self, source=None):
+        # Engine.loop calls this again from its finally clause after a client error already ended the game
+        if self.results is not None:
+            return
+
+        results_information = self.master_controller.return_final_results(self.clients, self.tick_number)
+        if source:
+            results_information['reason'] = source
+            self.master_controller.game_over = True
+        results_information['seed'] = self.seed
+        results_information['ticks'] = self.tick_number
+        for client, player_information in zip(self.clients, results_information['players']):
+            worker = self.client_workers.get(client.id)
+            player_information['turn_latency'] = latency_stats(worker.latencies_ns if worker is not None else [])
+        if self.profiler is not None:
+            self.profiler.restore()
+            results_information['profile'] = self.profiler.to_json()
+        self.results = results_information
+
+        for worker in self.client_workers.values():
+            worker.stop()
+        # a client that timed out may still be running; it would take CPU time from every game after this one
+        self.client_left_running = any([worker.join(CLIENT_STOP_SECONDS) for worker in self.client_workers.values()])
+
+        # wait for every queued tick to reach the disk before the worker moves on to the next game
+        if self.turn_log is not None:
+            self.turn_log.close(results_information)
+
+
+# one client module per worker process, imported once by init_worker, and the options every game is run with
+_client_module = None
+_client_error: str | None = None
+_log_dir: str | None = None
+_engine_options: dict = {}
+# set once a game leaves a client's thread running, after which the worker process takes no more games
+_client_left_running: bool = False
+
+# where batch runs write their results and saved states by default
+OUTPUT_DIR = 'batch_output'
+
+LOG_EXTENSIONS = {'none': '.jsonl', 'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+
+def load_client(client_path: str):
+    """
+    Imports the client file the same way the engine does: the file is checked for illegal imports and ``open`` first,
+    then imported by name with its directory on the path.
+    :return: the imported module (or None) and an error message if the client can't be used
+    """
+    client_dir, filename = os.path.split(os.path.abspath(client_path))
+    if client_dir not in sys.path:
+        sys.path.insert(1, client_dir)
+
+    imports, opening, printing = verify_code(os.path.join(client_dir, filename))
+    error = None
+    if len(imports) != 0:
+        error = f'Player has attempted illegal imports: {imports}'
+    if opening:
+        error = 'Player is using "open" which is forbidden.'
+
+    try:
+        return importlib.import_module(filename.removesuffix('.py')), error
+    except Exception:
+        return None, str(traceback.format_exc())
+
+
+def turn_log_path(log_dir: str, name: str | int, compression: str = 'none') -> str:
+    return os.path.join(log_dir, f'{name if isinstance(name, str) else f"seed_{name}"}{LOG_EXTENSIONS[compression]}')
+
+
+def init_worker(client_path: str, quiet: bool, log_dir: str | None = None, engine_options: dict | None = None) -> None:
+    global _client_module, _client_error, _log_dir, _engine_options
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    _client_module, _client_error = load_client(client_path)
+    _log_dir = log_dir
+    _engine_options = engine_options or {}
+
+
+def run_seed(seed: int) -> dict:
+    global _client_left_running
+    log_path = turn_log_path(_log_dir, seed, _engine_options.get('compression', 'none')) if _log_dir else None
+    engine = BatchEngine(seed, _client_module, _client_error, log_path, **_engine_options)
+    engine.loop()
+    _client_left_running |= engine.client_left_running
+    return engine.results
+
+
+def run_state(path: str) -> dict:
+    global _client_left_running
+    # the turn log of a restored game is named after the state it started from
+    name = os.path.basename(path).removesuffix('.state')
+    log_path = turn_log_path(_log_dir, name, _engine_options.get('compression', 'none')) if _log_dir else None
+    engine = BatchEngine(None, _client_module, _client_error, log_path, resume_from=path, **_engine_options)
+    engine.loop()
+    _client_left_running |= engine.client_left_running
+    return engine.results
+
+
+def worker_loop(tasks: multiprocessing.Queue, results: multiprocessing.Queue, client_path: str, quiet: bool,
+                log_dir: str | None, engine_options: dict) -> None:
+    """
+    Runs games in a worker process: ``(index, runner, argument)`` tasks come in, and ``(index, result, error)`` goes
+    back for each one, until a None task comes. A worker whose game left a client's thread running exits after
+    sending that game's result, since the thread can't be stopped and would slow down every game after it;
+    ``run_batch`` starts a new worker in its place.
+    """
+    init_worker(client_path, quiet, log_dir, engine_options)
+    while (task := tasks.get()) is not None:
+        index, runner, argument = task
+        try:
+            results.put((index, runner(argument), None))
+        except Exception:
+            results.put((index, None, traceback.format_exc()))
+        if _client_left_running:
+            return
+
+
+def run_batch(client_path: str, seeds: list[int], jobs: int | None = None, quiet: bool = True,
+              log_dir: str | None = None, compression: str = 'none',
+              keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL, profile: bool = False,
+              save_ticks: list[int] | None = None, state_dir: str | None = None,
+              states: list[str] | None = None) -> list[dict]:
+    """
+    Runs the client once per seed across long-lived worker processes (one per core by default). A worker only starts
+    over as a new process when a client it ran timed out and kept running (see ``worker_loop``).
+    If ``log_dir`` is given, the turn logs of every game are written there, one file per seed.
+    If ``profile`` is set, every result has the phase timings of its game under ``profile``.
+    If ``save_ticks`` are given, the state of every game at the end of each of those ticks is saved to ``state_dir``
+    (``batch_output/states`` by default, same as the command line).
+    If ``states`` are given, the games saved in them are played on from where they were saved, after the seeds.
+    :return: the results.json data of every game, in the same order as ``seeds`` and then ``states``
+    """
+    tasks = [(run_seed, seed) for seed in seeds] + [(run_state, path) for path in states or []]
+    if not tasks:
+        return []
+    jobs = jobs or os.cpu_count() or 1
+    if log_dir is not None:
+        os.makedirs(log_dir, exist_ok=True)
+    if state_dir is None:
+        state_dir = os.path.join(OUTPUT_DIR, 'states')
+    if save_ticks:
+        os.makedirs(state_dir, exist_ok=True)
+
+    engine_options = {'compression': compression, 'keyframe_interval': keyframe_interval, 'profile': profile,
+                      'save_ticks': save_ticks, 'state_dir': state_dir}
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for index, (runner, argument) in enumerate(tasks):
+        task_queue.put((index, runner, argument))
+
+    def start_worker() -> multiprocessing.Process:
+        process = multiprocessing.Process(target=worker_loop, daemon=True,
+                                          args=(task_queue, result_queue, client_path, quiet, log_dir,
+                                                engine_options))
+        process.start()
+        return process
+
+    results: list[dict | None] = [None] * len(tasks)
+    done = 0
+    workers = [start_worker() for _ in range(min(jobs, len(tasks)))]
+    try:
+        while done < len(tasks):
+            try:
+                index, result, error = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                pass
+            else:
+                if error is not None:
+                    raise RuntimeError(f'A game failed in a worker process:\n{error}')
+                results[index] = result
+                done += 1
+
+            # retired workers sent their last result before exiting; anything else that exited has lost a game
+            for worker in workers:
+                if not worker.is_alive() and worker.exitcode != 0:
+                    raise RuntimeError(f'A worker process died with exit code {worker.exitcode}.')
+            workers = [worker for worker in workers if worker.is_alive()]
+            while len(workers) < min(jobs, len(tasks) - done):
+                workers.append(start_worker())
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+
+    for _ in workers:
+        task_queue.put(None)
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def summarize(results: list[dict]) -> str:
+    scores = [result['players'][0]['avatar']['score'] for result in results
+              if result['players'] and result['players'][0]['avatar'] is not None]
+    errors = [result for result in results if 'reason' in result]
+
+    latencies = [result['players'][0]['turn_latency'] for result in results
+                 if result['players'] and result['players'][0]['turn_latency']['turns'] > 0]
+
+    output = f'{len(results)} games, {len(errors)} ended early'
+    if scores:
+        output += (f'\nscore: mean {sum(scores) / len(scores):.1f} | min {min(scores)} | max {max(scores)}')
+    if latencies:
+        output += (f'\nturn time (ms): worst p50 {max(latency["p50_ms"] for latency in latencies):.3f} | '
+                   f'worst p95 {max(latency["p95_ms"] for latency in latencies):.3f} | '
+                   f'max {max(latency["max_ms"] for latency in latencies):.3f}')
+    for result in errors:
+        output += f'\n  seed {result["seed"]}: {result["reason"]}'
+    return output
+
+
+if __name__ == '__main__':
+    par = argparse.ArgumentParser(description='Runs a client against many seeds without the launcher\'s '
+                                              'generate/run round trip')
+
+    par.add_argument('client', action='store', type=str, help='Path to the client file to run')
+
+    par.add_argument('-seeds', '-s', action='store', type=int, nargs='+', default=None, dest='seeds',
+                     help='Seeds to run the client against')
+
+    par.add_argument('-range', '-r', action='store', type=int, nargs=2, default=None, dest='seed_range',
+                     metavar=('START', 'END'), help='Runs every seed from START up to, but not including, END')
+
+    par.add_argument('-jobs', '-j', action='store', type=int, default=None, dest='jobs',
+                     help='Number of worker processes; defaults to one per core')
+
+    par.add_argument('-output', '-o', action='store', type=str, default=os.path.join(OUTPUT_DIR, 'batch_results.json'),
+                     dest='output', help='Where to write the results of every game')
+
+    par.add_argument('-logs', '-l', action='store', type=str, default=None, dest='log_dir',
+                     help='Writes the turn logs of every game to this directory, one file per seed')
+
+    par.add_argument('-compress', '-c', action='store', type=str, default='none', choices=COMPRESSIONS,
+                     dest='compression', help='Compression used for the turn logs')
+
+    par.add_argument('-keyframes', '-k', action='store', type=int, default=DEFAULT_KEYFRAME_INTERVAL,
+                     dest='keyframe_interval', help='Writes a full turn log every this many turns and only the '
+                                                    'changes in between; 1 writes every turn in full')
+
+    par.add_argument('-profile', '-p', action='store_true', default=False, dest='profile',
+                     help='Times every phase of each tick and writes the totals to profile.json next to the results')
+
+    par.add_argument('-save-states', '-S', action='store', type=int, nargs='+', default=None, dest='save_ticks',
+                     metavar='TICK', help='Saves the state of every game at the end of each of these ticks')
+
+    par.add_argument('-state-dir', action='store', type=str, default=os.path.join(OUTPUT_DIR, 'states'),
+                     dest='state_dir', help='Where -save-states writes the saved states')
+
+    par.add_argument('-resume', '-R', action='store', type=str, nargs='+', default=None, dest='states',
+                     metavar='STATE', help='Plays on the games saved in these states instead of starting new ones')
+
+    par.add_argument('-verbose', '-v', action='store_true', default=False, dest='verbose',
+                     help='Shows engine and client output instead of hiding it')
+
+    par_args = par.parse_args()
+
+    seeds: list[int] = list(par_args.seeds or [])
+    if par_args.seed_range is not None:
+        seeds.extend(range(*par_args.seed_range))
+    if not seeds and not par_args.states:
+        par.error('no seeds given; use -seeds and/or -range, or -resume')
+
+    batch_results = run_batch(par_args.client, seeds, par_args.jobs, quiet=not par_args.verbose,
+                              log_dir=par_args.log_dir, compression=par_args.compression,
+                              keyframe_interval=par_args.keyframe_interval, profile=par_args.profile,
+                              save_ticks=par_args.save_ticks, state_dir=par_args.state_dir, states=par_args.states)
+    profiles = [result.pop('profile') for result in batch_results if 'profile' in result]
+
+    output_dir = os.path.dirname(par_args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(par_args.output, 'w') as f:
+        json.dump(batch_results, f, indent='\t')
+
+    print(summarize(batch_results))
+
+    if par_args.profile:
+        total_ticks = sum(result['ticks'] for result in batch_results)
+        summary = profile_summary(merge_profiles(profiles), total_ticks)
+        with open(os.path.join(output_dir, 'profile.json'), 'w') as f:
+            json.dump({'games': len(batch_results), 'ticks': total_ticks, 'phases': summary}, f, indent='\t')
+        print(format_summary(summary))
@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+from typing import Any, Callable
+
+# batch puts the engine from launcher.pyz on the path, so it has to be imported before anything from `game`
+import batch
+from game.common.enums import ObjectType
+from game.common.map.game_board import GameBoard
+from game.controllers.master_controller import MasterController
+from game.controllers.pathfind_controller import a_star_path
+from game.utils.vector import Vector
+import pathfinding
+
+CLIENTS = ('idle', 'walker', 'pathing')
+DEFAULT_SEEDS = [1, 2, 3]
+DEFAULT_MAX_REGRESSION = 10.0
+DEFAULT_REPEAT = 3
+
+
+def run_games(client: str, seeds: list[int],
+              master_controller: type[MasterController] = batch.BatchMasterController) -> tuple[int, float]:
+    """
+    Plays one game per seed in this process with one of the benchmark clients, on a BatchEngine. With the engine's own
+    MasterController instead of BatchMasterController, the client's world is copied with ``deepcopy`` and the turn
+    logs are made with ``to_json``, the way the launcher's games do it; the rest of the launcher (reading the map from
+    ``logs/``, writing a file per turn) isn't part of either.
+    :return: the number of ticks played and the seconds it took
+    """
+    module = importlib.import_module(f'benchmarks.{client}_client')
+    ticks = 0
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for seed in seeds:
+            engine = batch.BatchEngine(seed, module)
+            engine.master_controller = master_controller()
+            engine.loop()
+            ticks += engine.tick_number
+    return ticks, time.perf_counter() - start
+
+
+def turns_per_second(client: str, seeds: list[int], repeat: int,
+                     master_controller: type[MasterController] = batch.BatchMasterController) -> float:
+    """
+    :return: the turns per second of the fastest of ``repeat`` runs of ``run_games``
+    """
+    return max(ticks / seconds for ticks, seconds in (run_games(client, seeds, master_controller)
+                                                      for _ in range(repeat)))
+
+
+def peak_memory(client: str, seed: int) -> int:
+    """
+    :return: the most memory (in bytes) allocated at once while playing one game
+    """
+    tracemalloc.start()
+    try:
+        run_games(client, [seed])
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def time_call(func: Callable[[], Any], min_seconds: float = 0.2, repeat: int = 5) -> float:
+    """
+    Calls ``func`` in loops of enough calls to take at least ``min_seconds``, ``repeat`` times.
+    :return: the fastest time of one call, in microseconds
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+        number *= 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def microbenchmarks(seed: int) -> dict[str, float]:
+    """
+    Times the engine's hot paths, and the A* clients use, on the board the given seed generates.
+    :return: microseconds per call of each one
+    """
+    board = batch.build_game_board(seed)
+    avatar_position: Vector = next(iter(board.get_objects(ObjectType.AVATAR)))
+    # the battery spawner furthest away gives A* the most work
+    goal: Vector = max(board.get_objects(ObjectType.BATTERY_SPAWNER), key=avatar_position.distance)
+    corner = Vector(board.map_size.x - 1, board.map_size.y - 1)
+    board_data = board.to_json()
+    # the engine's A* adds an empty container to the board for every empty tile it looks at, so it gets its own
+    path_board = batch.build_game_board(seed)
+
+    def from_json():
+        GameBoard().from_json(board_data)
+        batch.reset_global_state()
+
+    def client_a_star_path():
+        # a new world every turn means a new grid, so building it is part of what a client's first search costs
+        pathfinding.Grid.invalidate()
+        pathfinding.a_star_path(avatar_position, goal, path_board)
+
+    timings = {
+        'a_star_path': time_call(lambda: a_star_path(avatar_position, goal, path_board)),
+        'client_a_star_path': time_call(client_a_star_path),
+        'get_positions_overlapped_by_line': time_call(
+            lambda: Vector.get_positions_overlapped_by_line(Vector(0, 0), corner)),
+        'get_objects': time_call(lambda: board.get_objects(ObjectType.WALL)),
+        'to_json': time_call(board.to_json),
+        'from_json': time_call(from_json),
+        'deepcopy': time_call(lambda: deepcopy(board)),
+        'snapshot': time_call(lambda: batch.snapshot(board)),
+    }
+    return timings
+
+
+def run_benchmarks(clients: list[str], seeds: list[int], repeat: int = DEFAULT_REPEAT) -> dict[str, dict]:
+    """
+    :return: every measurement by name, with its value, unit and whether a higher value is better
+    """
+    metrics: dict[str, dict] = {}
+    for client in clients:
+        metrics[f'engine.{client}.turns_per_second'] = {'value': turns_per_second(client, seeds, repeat),
+                                                       'unit': 'turns/s', 'higher_is_better': True}
+        metrics[f'engine.{client}.deepcopy_turns_per_second'] = {
+            'value': turns_per_second(client, seeds, repeat, MasterController), 'unit': 'turns/s',
+            'higher_is_better': True}
+        metrics[f'engine.{client}.peak_memory'] = {'value': peak_memory(client, seeds[0]) / 2 ** 20, 'unit': 'MiB',
+                                                  'higher_is_better': False}
+
+    for name, microseconds in microbenchmarks(seeds[0]).items():
+        metrics[f'micro.{name}'] = {'value': microseconds, 'unit': 'us/call', 'higher_is_better': False}
+    return metrics
+
+
+def regressions(metrics: dict[str, dict], baseline: dict[str, dict], max_regression: float) -> dict[str, float]:
+    """
+    Compares the measurements to a baseline. Measurements the baseline doesn't have are skipped.
+    :return: how many percent worse every measurement that got worse by more than ``max_regression`` percent is
+    """
+    failed = {}
+    for name, metric in metrics.items():
+        if name not in baseline or baseline[name]['value'] == 0:
+            continue
+        before = baseline[name]['value']
+        change = (before - metric['value']) if metric['higher_is_better'] else (metric['value'] - before)
+        percent = 100 * change / before
+        if percent > max_regression:
+            failed[name] = percent
+    return failed
+
+
+def format_metrics(metrics: dict[str, dict], baseline: dict[str, dict] | None = None) -> str:
+    width = max(len(name) for name in metrics)
+    lines = []
+    for name, metric in metrics.items():
+        line = f'{name:<{width}}  {metric["value"]:>12.2f} {metric["unit"]}'
+        if baseline is not None and name in baseline and baseline[name]['value']:
+            line += f'  ({100 * (metric["value"] / baseline[name]["value"] - 1):+.1f}% vs baseline)'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    par = argparse.ArgumentParser(description='Measures engine throughput, memory and hot path timings, and fails '
+                                              'when they regress against a baseline')
+
+    par.add_argument('-clients', '-c', action='store', type=str, nargs='+', default=list(CLIENTS), choices=CLIENTS,
+                     dest='clients', help='Benchmark clients to play the games with')
+
+    par.add_argument('-seeds', '-s', action='store', type=int, nargs='+', default=DEFAULT_SEEDS, dest='seeds',
+                     help='Seeds of the games played by every client; the first one is also used for the '
+                          'microbenchmarks')
+
+    par.add_argument('-repeat', '-r', action='store', type=int, default=DEFAULT_REPEAT, dest='repeat',
+                     help='How many times the games are played; the fastest run is the one reported')
+
+    par.add_argument('-baseline', '-b', action='store', type=str, default=None, dest='baseline',
+                     help='Baseline to compare against; exits with an error if anything regressed')
+
+    par.add_argument('-save-baseline', action='store', type=str, default=None, dest='save_baseline',
+                     help='Writes the measurements to this file to be used as a baseline later')
+
+    par.add_argument('-max-regression', '-m', action='store', type=float, default=DEFAULT_MAX_REGRESSION,
+                     dest='max_regression', help='How many percent worse than the baseline a measurement may get')
+
+    par_args = par.parse_args()
+
+    results = run_benchmarks(par_args.clients, par_args.seeds, par_args.repeat)
+
+    baseline_metrics = None
+    if par_args.baseline is not None:
+        with open(par_args.baseline) as f:
+            baseline_metrics = json.load(f)['metrics']
+
+    print(format_metrics(results, baseline_metrics))
+
+    if par_args.save_baseline is not None:
+        with open(par_args.save_baseline, 'w') as f:
+            json.dump({'python': sys.version, 'seeds': par_args.seeds, 'repeat': par_args.repeat, 'metrics': results}, f, indent='\t')
+
+    if baseline_metrics is not None:
+        failed = regressions(results, baseline_metrics, par_args.max_regression)
+        for failed_name, failed_percent in failed.items():
+            print(f'REGRESSION: {failed_name} is {failed_percent:.1f}% worse than the baseline '
+                  f'(allowed: {par_args.max_regression}%)')
+        if failed:
+            sys.exit(1)
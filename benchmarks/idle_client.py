@@ -0,0 +1,16 @@
+from game.client.user_client import UserClient
+from game.common.avatar import Avatar
+from game.common.enums import ActionType
+from game.common.map.game_board import GameBoard
+
+
+class Client(UserClient):
+    """
+    Never does anything, so the engine's own work is all that's measured.
+    """
+
+    def team_name(self) -> str:
+        return 'Idle Benchmark'
+
+    def take_turn(self, turn: int, world: GameBoard, avatar: Avatar) -> list[ActionType]:
+        return []
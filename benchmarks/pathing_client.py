@@ -0,0 +1,29 @@
+from game.client.user_client import UserClient
+from game.common.avatar import Avatar
+from game.common.enums import ActionType, ObjectType
+from game.common.map.game_board import GameBoard
+from pathfinding import Grid, a_star_move, a_star_positions
+
+
+class Client(UserClient):
+    """
+    Runs A* to every battery spawner on the map each turn and heads for the closest one, like a client that leans on
+    pathfinding heavily.
+    """
+
+    def team_name(self) -> str:
+        return 'Pathing Benchmark'
+
+    def take_turn(self, turn: int, world: GameBoard, avatar: Avatar) -> list[ActionType]:
+        closest = None
+        closest_length = None
+        for position in Grid.of(world).get_objects(ObjectType.BATTERY_SPAWNER):
+            path = a_star_positions((avatar.position.x, avatar.position.y), (position.x, position.y), world,
+                                    game_object=avatar)
+            if path is not None and (closest_length is None or len(path) < closest_length):
+                closest, closest_length = position, len(path)
+
+        if closest is None:
+            return []
+        move = a_star_move(avatar.position, closest, world, game_object=avatar)
+        return [move, ActionType.INTERACT_CENTER] if move is not None else [ActionType.INTERACT_CENTER]
@@ -0,0 +1,25 @@
+import random
+
+from game.client.user_client import UserClient
+from game.common.avatar import Avatar
+from game.common.enums import ActionType
+from game.common.map.game_board import GameBoard
+
+MOVES = [ActionType.MOVE_UP, ActionType.MOVE_DOWN, ActionType.MOVE_LEFT, ActionType.MOVE_RIGHT]
+
+
+class Client(UserClient):
+    """
+    Walks around at random, so the avatar moves, interacts and gets chased like in a real game.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # its own generator, so the client doesn't change the random numbers the bots get
+        self.random = random.Random(0)
+
+    def team_name(self) -> str:
+        return 'Walker Benchmark'
+
+    def take_turn(self, turn: int, world: GameBoard, avatar: Avatar) -> list[ActionType]:
+        return [self.random.choice(MOVES), ActionType.INTERACT_CENTER]
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import pickle
+from typing import Any
+
+# the engine's objects are only importable once batch has put launcher.pyz on the path, so everything from `game` is
+# imported where it is used
+
+MAGIC = b'BLMAP1\n'
+DEFAULT_CACHE_DIR = '.map_cache'
+
+# the compiled maps this process has loaded, by content hash
+_loaded: dict[str, bytes] = {}
+# the cache key of the configured map, which only has to be worked out once per process
+_source_key: str | None = None
+
+
+def map_source() -> tuple[str, bytes]:
+    """
+    Finds the map the engine would generate games on: the LDtk project from the config (``PATH_TO_LDTK_PROJECT``),
+    or ``game/map_data.py`` if ``USE_PRECOMPILED_MAP`` is set.
+    :return: a description of the source and its contents
+    """
+    from game.config import PATH_TO_LDTK_PROJECT, USE_PRECOMPILED_MAP
+
+    if USE_PRECOMPILED_MAP:
+        spec = importlib.util.find_spec('game.map_data')
+        return spec.origin, spec.loader.get_source('game.map_data').encode()
+
+    with open(PATH_TO_LDTK_PROJECT, 'rb') as f:
+        return PATH_TO_LDTK_PROJECT, f.read()
+
+
+def engine_source() -> bytes:
+    """
+    Returns the contents of the archive the engine is imported from (launcher.pyz), or nothing if it's imported from
+    plain files. The compiled maps hold the engine's own objects, so a new launcher needs new ones.
+    """
+    import game
+
+    path = os.path.dirname(game.__file__)
+    while not os.path.isfile(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return b''
+        path = parent
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def cache_key(source: bytes) -> str:
+    """
+    :return: the name of the compiled map of the given map source, a hash of it, the compiled map format and the engine
+    """
+    digest = hashlib.sha256(MAGIC)
+    digest.update(hashlib.sha256(engine_source()).digest())
+    digest.update(source)
+    return digest.hexdigest()[:16]
+
+
+def compiled_map_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f'{key}.map')
+
+
+def compile_map() -> bytes:
+    """
+    Parses the map (see ``map_source``) into the locations and map size ``GameBoard`` is made with, and packs them
+    into a compiled map: ``MAGIC`` followed by a pickle of the objects themselves. The objects are pickled as they
+    are, rather than written out as a table of tiles and entities, so a loaded map is exactly what parsing makes,
+    down to the state ``to_json`` leaves out; every game needs its own objects to change anyway, so there is nothing
+    a read-only mapping of the file could share between them.
+
+    Parsing hands out ids from ``GameObject``'s counter (when batch has replaced ``uuid`` with one), so how many it
+    took is stored too and the counter is wound back. Loading the map counts them again, so the objects made after it
+    get the same ids as if the map had been parsed right there.
+    """
+    from game.common.game_object import GameObject
+    from game.common.map.game_board import GameBoard
+    from game.config import PATH_TO_LDTK_PROJECT, USE_PRECOMPILED_MAP
+    from game.utils.vector import Vector
+    import game.common.game_object
+
+    ids = game.common.game_object.uuid
+    first_id = getattr(ids, 'last_id', None)
+
+    locations: dict[Vector, list[GameObject]]
+    map_size: Vector
+    if USE_PRECOMPILED_MAP:
+        from game.map_data import MAP_DICT, MAP_SIZE
+        locations = GameBoard.locations_from_json_dict(MAP_DICT)
+        map_size = Vector.new_from_json(MAP_SIZE)
+    else:
+        from game.utils.ldtk_helpers import map_data_from_ldtk_file
+        locations, map_size = map_data_from_ldtk_file(PATH_TO_LDTK_PROJECT)
+
+    ids_used = None
+    if first_id is not None:
+        # loading counts these, not compiling
+        ids_used = ids.last_id - first_id
+        ids.last_id = first_id
+
+    payload: dict[str, Any] = {'map_size': map_size, 'locations': locations, 'ids_used': ids_used}
+    return MAGIC + pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_compiled_map(cache_dir: str) -> str:
+    """
+    Compiles the map into the cache directory, named by its ``cache_key``.
+    :return: the path of the compiled map
+    """
+    _, source = map_source()
+    path = compiled_map_path(cache_dir, cache_key(source))
+    data = compile_map()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # written next to it and moved into place, so processes starting at the same time never read half a file
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return path
+
+
+def read_compiled_map(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path} is not a compiled map')
+    return data
+
+
+def load_map(cache_dir: str = DEFAULT_CACHE_DIR) -> tuple[dict, Any]:
+    """
+    Returns new locations and map size for a ``GameBoard``, the same as parsing the map would, from the compiled map
+    of the map's current contents. The map is compiled into ``cache_dir`` the first time, and a process only reads
+    the file once; every call after that is one unpickle. A changed map or a new launcher gets a new key, and so a
+    new compiled map (the next time a process starts).
+    :return: the locations and the map size
+    """
+    global _source_key
+    if _source_key is None:
+        _source_key = cache_key(map_source()[1])
+    key = _source_key
+
+    data = _loaded.get(key)
+    if data is None:
+        path = compiled_map_path(cache_dir, key)
+        if not os.path.exists(path):
+            write_compiled_map(cache_dir)
+        data = _loaded[key] = read_compiled_map(path)
+
+    payload = pickle.loads(memoryview(data)[len(MAGIC):])
+
+    import game.common.game_object
+    ids = game.common.game_object.uuid
+    if payload['ids_used'] is not None and hasattr(ids, 'last_id'):
+        ids.last_id += payload['ids_used']
+    return payload['locations'], payload['map_size']
+
+
+if __name__ == '__main__':
+    # puts the engine from launcher.pyz on the path
+    import batch
+
+    par = argparse.ArgumentParser(description='Compiles the map into the binary form batch runs load games from')
+
+    par.add_argument('-cache-dir', action='store', type=str, default=DEFAULT_CACHE_DIR, dest='cache_dir',
+                     help='Directory to write the compiled map to')
+
+    par_args = par.parse_args()
+
+    source_name, _ = map_source()
+    print(f'Compiled {source_name} to {write_compiled_map(par_args.cache_dir)}')
@@ -1,6 +1,6 @@
 import heapq
-from typing import Dict, List, Tuple, Optional
-from game.common.enums import ActionType, ObjectType
+from typing import Dict, Iterable, List, Tuple, Optional
+from game.common.enums import ActionType, ObjectType, BOT_OBJECT_TYPES
 from game.common.game_object import GameObject
 from game.common.map.occupiable import Occupiable
 from game.constants import DIRECTION_TO_MOVE
@@ -10,72 +10,1382 @@ Position = Tuple[int, int]
 
 DIRECTIONS = [(1,0), (-1,0), (0,1), (0,-1)]
 
+# the objects whose tiles can open and close during a game
+GATE_TYPES: Tuple[ObjectType, ...] = (ObjectType.DOOR, ObjectType.VENT, ObjectType.REFUGE)
 
-def a_star_move(start: Vector, goal: Vector, world, allow_vents: bool = True, game_object: GameObject | None = None) -> ActionType | None:
-    path = a_star_path(
-        start=start,
-        goal=goal,
+# the move for every step between neighboring positions, so picking a move doesn't need any Vectors
+STEP_TO_MOVE: Dict[Position, ActionType] = {(direction.x, direction.y): move
+                                             for direction, move in DIRECTION_TO_MOVE.items()}
+
+
+class Grid:
+    """
+    `Grid Notes:`
+
+        A dense copy of a GameBoard's game_map for fast lookups: one flat list of GameObjectContainers indexed by
+        ``y * width + x`` (None where the board has no container), so a tile is found with one list index instead of
+        hashing a Vector. The queries mirror GameBoard's, but take plain x and y ints.
+
+        The first time the types are asked for, the position of every object is indexed by its ObjectType, so
+        ``get_objects`` only costs as much as the number of matches instead of a scan of the whole map. The types on
+        every tile are kept as well, so ``has`` answers whether a tile has an object of some type without looking at
+        its objects. Searches don't need them, so a grid that is only searched never builds them.
+
+        Which tiles a mover can step on is kept in passability layers: one bytearray per kind of mover (its class and
+        ObjectType, and whether vents are allowed), with a 1 for every tile it can pass. A layer is only built the
+        first time ``passability`` is asked for it, after which pathfinding reads one byte per tile instead of
+        walking the tile's objects again.
+
+        Each layer can also be split into connected components (``components``), which tells in a few lookups whether
+        a tile can be reached at all. Labelling them walks the whole map, so searches only do it once one has failed
+        (``known_unreachable``); searches for a tile that can't be reached then fail right away instead of after
+        walking everything that can. Distance fields (see ``DistanceField``) are kept per root and layer too, so
+        every chaser of the same kind heading for the same spot shares one search for the turn.
+
+        The world each turn is a new copy, so ``Grid.of`` builds the grid once per world and hands the same one out
+        for the rest of the turn. The grid doesn't notice changes made to the world afterward, and neither does
+        anything that finds its grid with ``Grid.of`` (a_star_path and the rest of this module): a world changed in
+        place gets paths for what it was before. If the objects on a tile change (a door opens, a refuge closes,
+        something moves onto it), ``update`` brings that tile's passability and types up to date (and drops what was
+        worked out from them); for anything bigger, call ``Grid.invalidate()`` so the next ``Grid.of`` builds a new
+        one.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.width: int = world.map_size.x
+        self.height: int = world.map_size.y
+        self.cells: list = [None] * (self.width * self.height)
+        # the types on every tile and the positions by type, only worked out once something asks for them
+        self.__cell_types: List[frozenset] | None = None
+        self.__by_type: Dict[ObjectType, List[Position]] = {}
+        self.__occupied: List[Position] = []
+        self.layers: Dict[tuple, bytearray] = {}
+        self.movers: Dict[tuple, Tuple[GameObject | None, bool]] = {}
+        self.components_by_layer: Dict[tuple, List[int]] = {}
+        self.fingerprints: Dict[tuple, bytes] = {}
+        self.fields: Dict[tuple, 'DistanceField'] = {}
+        width, height, cells = self.width, self.height, self.cells
+        for vec, container in world.game_map.items():
+            x, y = vec.x, vec.y
+            if 0 <= x < width and 0 <= y < height:
+                cells[y * width + x] = container
+
+    @property
+    def cell_types(self) -> List[frozenset]:
+        if self.__cell_types is None:
+            self.__index()
+        return self.__cell_types
+
+    @property
+    def by_type(self) -> Dict[ObjectType, List[Position]]:
+        if self.__cell_types is None:
+            self.__index()
+        return self.__by_type
+
+    @property
+    def occupied(self) -> List[Position]:
+        if self.__cell_types is None:
+            self.__index()
+        return self.__occupied
+
+    def __index(self) -> None:
+        # in the order of the world's game_map, which is the order GameBoard.get_objects goes in
+        width, height = self.width, self.height
+        self.__cell_types = [frozenset()] * (width * height)
+        for vec, container in self.world.game_map.items():
+            x, y = vec.x, vec.y
+            if not (0 <= x < width and 0 <= y < height):
+                continue
+            index = y * width + x
+            position = (x, y)
+            if container.get_top() is not None:
+                self.__occupied.append(position)
+            cell_types = self.__cell_types[index] = self.__types_of(container)
+            for object_type in cell_types:
+                self.__by_type.setdefault(object_type, []).append(position)
+
+    # the last world a grid was built for, and that grid
+    __cached: tuple | None = None
+
+    @staticmethod
+    def of(world) -> 'Grid':
+        """
+        Returns the grid of the world, building it only if the last one asked for was of another world. Changes made
+        to the world after its grid was built aren't seen until ``Grid.invalidate()`` is called.
+        """
+        cached = Grid.__cached
+        if cached is None or cached[0] is not world:
+            cached = Grid.__cached = (world, Grid(world))
+        return cached[1]
+
+    @staticmethod
+    def invalidate() -> None:
+        """
+        Drops the grid ``Grid.of`` hands out, so the next call builds a new one from the world as it is then. Call it
+        after changing a world in place (adding, moving or removing objects) before pathfinding on it again.
+        """
+        Grid.__cached = None
+
+    @staticmethod
+    def __types_of(container) -> frozenset:
+        return frozenset(game_object.object_type for game_object in container)
+
+    @staticmethod
+    def mover_key(game_object: GameObject | None, allow_vents: bool) -> tuple:
+        # what the passability of a tile depends on besides the tile: the mover's class and type, and the vents
+        return None if game_object is None else (type(game_object), game_object.object_type), allow_vents
+
+    def is_valid_coords(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x: int, y: int):
+        """
+        Returns the GameObjectContainer at the coordinates, or None if there isn't one. Unlike GameBoard.get, nothing
+        is added to the map for empty tiles.
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return self.cells[y * self.width + x]
+
+    def get_top(self, x: int, y: int) -> GameObject | None:
+        container = self.get(x, y)
+        return container.get_top() if container is not None else None
+
+    def has(self, x: int, y: int, object_type: ObjectType) -> bool:
+        """
+        Same as GameBoard.object_is_found_at: whether the tile has an object of the given type. False off the map
+        and on empty tiles (where GameBoard raises a KeyError).
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        return object_type in self.cell_types[y * self.width + x]
+
+    def positions(self, object_type: ObjectType) -> List[Position]:
+        """
+        Returns the coordinates of every tile with an object of the given type, in the same order as
+        GameBoard.get_objects. No type (or ObjectType.NONE) gives every tile with anything on it.
+        """
+        if object_type is None or object_type is ObjectType.NONE:
+            return self.occupied
+        return self.by_type.get(object_type, [])
+
+    def get_objects(self, object_type: ObjectType | None) -> Dict[Vector, List[GameObject]]:
+        """
+        Same as GameBoard.get_objects: the objects of the given type, by position.
+        """
+        return {Vector(x, y): self.cells[y * self.width + x].get_objects(object_type)
+                for x, y in self.positions(object_type)}
+
+    def can_object_occupy(self, x: int, y: int, game_object: GameObject) -> bool:
+        """
+        Same as GameBoard.can_object_occupy: empty tiles can be occupied, tiles with something other than an
+        Occupiable on top can't, and otherwise it's up to the Occupiable.
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        top = self.get_top(x, y)
+        if top is None:
+            return True
+        if not isinstance(top, Occupiable):
+            return False
+        return top.can_be_occupied_by(game_object)
+
+    def is_passable(self, x: int, y: int, game_object: GameObject | None = None, allow_vents: bool = True) -> bool:
+        """
+        Whether pathfinding may step on the tile: the mover (if given) must be able to occupy it, and nothing on top
+        may block it. Walls block, vents block unless they are allowed, anything that isn't Occupiable blocks, and an
+        avatar on top never blocks.
+        """
+        if game_object is not None and not self.can_object_occupy(x, y, game_object):
+            return False
+
+        if not self.is_valid_coords(x, y):
+            return False
+
+        top = self.get_top(x, y)
+        if top and top.object_type != ObjectType.AVATAR:
+            # walls block
+            if top.object_type == ObjectType.WALL:
+                return False
+
+            # vents block unless allowed
+            if top.object_type == ObjectType.VENT and not allow_vents:
+                return False
+
+            # can't pass through non-occupiable
+            if not isinstance(top, Occupiable):
+                return False
+
+        return True
+
+    def passability(self, game_object: GameObject | None = None, allow_vents: bool = True) -> bytearray:
+        """
+        Returns the passability layer for the mover, indexed by ``y * width + x``. Movers of the same class and
+        ObjectType share a layer, since that is all the Occupiables on the map look at.
+        """
+        key = self.mover_key(game_object, allow_vents)
+        layer = self.layers.get(key)
+        if layer is None:
+            # empty tiles can be passed by anything and walls by nothing, so only the others need a closer look
+            width = self.width
+            layer = self.layers[key] = bytearray(b'\x01') * (width * self.height)
+            for index, container in enumerate(self.cells):
+                if container is None:
+                    continue
+                top = container.get_top()
+                if top is None:
+                    continue
+                if top.object_type is ObjectType.WALL:
+                    layer[index] = 0
+                else:
+                    layer[index] = self.is_passable(index % width, index // width, game_object, allow_vents)
+            self.movers[key] = (game_object, allow_vents)
+        return layer
+
+    def components(self, game_object: GameObject | None = None, allow_vents: bool = True) -> List[int]:
+        """
+        Returns the connected component of every tile in the mover's passability layer, indexed by
+        ``y * width + x``: tiles with the same number can be walked between, and impassable tiles are -1.
+        """
+        key = self.mover_key(game_object, allow_vents)
+        labels = self.components_by_layer.get(key)
+        if labels is not None:
+            return labels
+
+        width, height = self.width, self.height
+        passable = self.passability(game_object, allow_vents)
+        labels = self.components_by_layer[key] = [-1] * (width * height)
+        label = 0
+        for first in range(width * height):
+            if not passable[first] or labels[first] != -1:
+                continue
+            labels[first] = label
+            queue = [first]
+            head = 0
+            while head < len(queue):
+                index = queue[head]
+                head += 1
+                x, y = index % width, index // width
+                for dx, dy in DIRECTIONS:
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < width and 0 <= ny < height and passable[ny * width + nx] \
+                            and labels[ny * width + nx] == -1:
+                        labels[ny * width + nx] = label
+                        queue.append(ny * width + nx)
+            label += 1
+        return labels
+
+    def can_reach(self, start: Position, goal: Position, game_object: GameObject | None = None,
+                  allow_vents: bool = True) -> bool:
+        """
+        Whether the mover has any way from start to goal, from the components: the goal has to be in the same one as
+        a passable tile next to the start (the start itself doesn't have to be passable, like in a_star_positions).
+        """
+        if start == goal:
+            return True
+        width, height = self.width, self.height
+        if not (0 <= goal[0] < width and 0 <= goal[1] < height):
+            return False
+        labels = self.components(game_object, allow_vents)
+        goal_label = labels[goal[1] * width + goal[0]]
+        if goal_label == -1:
+            return False
+        for dx, dy in DIRECTIONS:
+            nx, ny = start[0] + dx, start[1] + dy
+            if 0 <= nx < width and 0 <= ny < height and labels[ny * width + nx] == goal_label:
+                return True
+        return False
+
+    def known_unreachable(self, start: Position, goal: Position, game_object: GameObject | None = None,
+                          allow_vents: bool = True) -> bool:
+        """
+        Whether the mover's components, if they have been worked out already, say it can't get from start to goal.
+        Unlike ``can_reach``, this never labels the components itself.
+        """
+        if self.mover_key(game_object, allow_vents) not in self.components_by_layer:
+            return False
+        return not self.can_reach(start, goal, game_object, allow_vents)
+
+    def gate_fingerprint(self, game_object: GameObject | None = None, allow_vents: bool = True) -> bytes:
+        """
+        Returns whether the mover can pass each tile with a gate on it (see GATE_TYPES), in order of position. Two
+        worlds of the same map with the same fingerprint have every door, vent and refuge the same for the mover.
+        """
+        key = self.mover_key(game_object, allow_vents)
+        fingerprint = self.fingerprints.get(key)
+        if fingerprint is None:
+            passable = self.passability(game_object, allow_vents)
+            gates = sorted({y * self.width + x for object_type in GATE_TYPES for x, y in self.positions(object_type)})
+            fingerprint = self.fingerprints[key] = bytes(passable[index] for index in gates)
+        return fingerprint
+
+    def distance_field(self, root: Position, game_object: GameObject | None = None,
+                       allow_vents: bool = True) -> 'DistanceField':
+        """
+        Returns the distance field to ``root`` for the mover, searching it only the first time it's asked for.
+        """
+        key = (root, self.mover_key(game_object, allow_vents))
+        field = self.fields.get(key)
+        if field is None:
+            field = self.fields[key] = DistanceField(self, root, self.passability(game_object, allow_vents))
+        return field
+
+    def update(self, x: int, y: int) -> None:
+        """
+        Reads the tile from the world again, and works its passability out again in every layer built so far, after
+        the objects on it changed. Tiles that were empty when the grid was built are read too, since placing something
+        there gives them a container. The positions ``get_objects`` and ``positions`` give out aren't changed.
+        """
+        if not self.is_valid_coords(x, y):
+            return
+        container = self.cells[y * self.width + x] = self.world.game_map.get(Vector(x, y))
+        self.cell_types[y * self.width + x] = self.__types_of(container) if container is not None else frozenset()
+        self.components_by_layer.clear()
+        self.fingerprints.clear()
+        self.fields.clear()
+        for key, layer in self.layers.items():
+            game_object, allow_vents = self.movers[key]
+            layer[y * self.width + x] = self.is_passable(x, y, game_object, allow_vents)
+
+
+class DistanceField:
+    """
+    `Distance Field Notes:`
+
+        How many steps every tile is from one root tile, found with a single breadth-first search out from the root
+        over a passability layer. Any number of movers can then take their next step toward the root with a few list
+        lookups each, instead of each one searching for its own path, which is what several bots chasing the avatar
+        need every turn.
+
+        The distances are what A* would find going from the tile to the root: every tile stepped on must be passable,
+        but the tile the mover starts on doesn't have to be. Tiles that can't reach the root have no distance.
+    """
+
+    def __init__(self, grid: Grid, root: Position, passable: bytearray):
+        self.width: int = grid.width
+        self.height: int = grid.height
+        self.root: Position = root
+        self.passable: bytearray = passable
+        self.distances: List[int] = [-1] * (self.width * self.height)
+
+        width, height = self.width, self.height
+        root_x, root_y = root
+        if not (0 <= root_x < width and 0 <= root_y < height):
+            return
+
+        distances = self.distances
+        distances[root_y * width + root_x] = 0
+        if not passable[root_y * width + root_x]:
+            # nothing can step onto the root
+            return
+
+        # a list and a read position instead of a deque, since clients can't import collections
+        queue = [root]
+        head = 0
+        while head < len(queue):
+            x, y = queue[head]
+            head += 1
+            next_distance = distances[y * width + x] + 1
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                index = ny * width + nx
+                if distances[index] != -1:
+                    continue
+                distances[index] = next_distance
+                # the search only goes on from tiles that can be stepped on; the others can only be started from
+                if passable[index]:
+                    queue.append((nx, ny))
+
+    def distance(self, x: int, y: int) -> int | None:
+        """
+        :return: the number of steps from the tile to the root, or None if it can't get there
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        distance = self.distances[y * self.width + x]
+        return distance if distance != -1 else None
+
+    def next_position(self, x: int, y: int) -> Position | None:
+        """
+        :return: the neighboring tile one step closer to the root (the first one in DIRECTIONS if there are several),
+            or None on the root and on tiles that can't get there
+        """
+        distance = self.distance(x, y)
+        if not distance:
+            return None
+        width, height, distances, passable = self.width, self.height, self.distances, self.passable
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height and passable[ny * width + nx] \
+                    and distances[ny * width + nx] == distance - 1:
+                return nx, ny
+        return None
+
+    def next_move(self, x: int, y: int) -> ActionType | None:
+        """
+        :return: the move one step closer to the root, or None if there isn't one
+        """
+        position = self.next_position(x, y)
+        if position is None:
+            return None
+        return STEP_TO_MOVE.get((position[0] - x, position[1] - y))
+
+
+def chase_move(start: Vector, goal: Vector, world, allow_vents: bool = True, game_object: GameObject | None = None) -> ActionType | None:
+    """
+    Same as a_star_move, but from the distance field to ``goal``, which every call for the same goal and kind of mover
+    shares for the rest of the turn. The move is along a shortest path like a_star_move's, though it may be a different
+    one when several are just as short.
+    """
+    field = Grid.of(world).distance_field((goal.x, goal.y), game_object, allow_vents)
+    return field.next_move(start.x, start.y)
+
+
+def a_star_move(start: Vector, goal: Vector, world, allow_vents: bool = True, game_object: GameObject | None = None,
+                max_expansions: int | None = None) -> ActionType | None:
+    path = a_star_positions(
+        start=(start.x, start.y),
+        goal=(goal.x, goal.y),
         world=world,
         allow_vents=allow_vents,
-        game_object=game_object
+        game_object=game_object,
+        max_expansions=max_expansions
     )
 
     if not path or len(path) < 2:
         return None
 
-    next_step: Vector = path[1]
-    direction = next_step - start
-    action = DIRECTION_TO_MOVE.get(direction)
-    return action
+    next_x, next_y = path[1]
+    return STEP_TO_MOVE.get((next_x - start.x, next_y - start.y))
+
+def a_star_path(start: Vector, goal: Vector, world, allow_vents = True, game_object: GameObject | None = None,
+                max_expansions: int | None = None) -> Optional[List[Vector]]:
+    """
+    Finds the shortest path from start to goal. The world is looked at through ``Grid.of(world)``, which is built
+    once per world: if the world was changed in place since the last search on it (a wall placed, an object moved),
+    call ``Grid.invalidate()`` first, or the path is found on the world as it was.
+    :return: the tiles from start to goal (both included), or None if there is no path
+    """
+    path = a_star_positions((start.x, start.y), (goal.x, goal.y), world, allow_vents, game_object, max_expansions)
+    if path is None:
+        return None
+    return [Vector(x, y) for x, y in path]
+
+# came_from of the tiles next to a start that is off the map
+FROM_OFF_MAP = -2
 
-def a_star_path(start: Vector, goal: Vector, world, allow_vents = True, game_object: GameObject | None = None) -> Optional[List[Vector]]:
-    start_p = (start.x, start.y)
-    goal_p = (goal.x, goal.y)
+def a_star_positions(start: Position, goal: Position, world, allow_vents = True, game_object: GameObject | None = None,
+                     max_expansions: int | None = None) -> Optional[List[Position]]:
+    """
+    Same as a_star_path, but with (x, y) tuples in and out. Vectors are full GameObjects and slow to make, so this is
+    what to use when the path is only looked at, not handed back to the game.
 
-    frontier = [(0, start_p)]
-    came_from = {start_p: None}
-    cost = {start_p: 0}
+    The search works on flat tile indices against the mover's passability layer, keeps its costs, parents and closed
+    tiles in lists sized to the map, and pushes plain ints onto the heap: the f cost, then x, then y, packed into one
+    number. Ties are broken by x and then y, the same order as the (priority, (x, y)) tuples this used to push, so the
+    paths don't change. Every tile is expanded at most once, and the path is walked back and reversed in one go. Goals
+    in another connected component than the start are turned down without searching once a search on the same grid
+    has failed, which is when the components are labelled (see ``Grid.known_unreachable``).
 
+    :param max_expansions: if given, how many tiles the search may expand before it gives up and returns None
+    :return: the tiles from start to goal (both included), or None if there is no path
+    """
+    if start == goal:
+        return [start]
+
+    grid = Grid.of(world)
+    # a goal that can't be reached at all is known without searching everything that can
+    if grid.known_unreachable(start, goal, game_object, allow_vents):
+        return None
+    passable = grid.passability(game_object, allow_vents)
+    width, height = grid.width, grid.height
+    size = width * height
+    start_x, start_y = start
+    goal_x, goal_y = goal
+    if not (0 <= goal_x < width and 0 <= goal_y < height) or not passable[goal_y * width + goal_x]:
+        return None
+    goal_index = goal_y * width + goal_x
+
+    cost = [-1] * size
+    came_from = [-1] * size
+    closed = bytearray(size)
+    frontier: List[int] = []
+    push, pop = heapq.heappush, heapq.heappop
+
+    if 0 <= start_x < width and 0 <= start_y < height:
+        cost[start_y * width + start_x] = 0
+        frontier.append(start_x * height + start_y)
+    else:
+        # a start off the map is never expanded itself, but its neighbors on the map are a step away from it
+        for dx, dy in DIRECTIONS:
+            nx, ny = start_x + dx, start_y + dy
+            if not (0 <= nx < width and 0 <= ny < height) or not passable[ny * width + nx]:
+                continue
+            cost[ny * width + nx] = 1
+            came_from[ny * width + nx] = FROM_OFF_MAP
+            push(frontier, ((1 + abs(nx - goal_x) + abs(ny - goal_y)) * width + nx) * height + ny)
+
+    expansions = 0
     while frontier:
-        _, current = heapq.heappop(frontier)
+        packed = pop(frontier) % size
+        x, y = divmod(packed, height)
+        current = y * width + x
+        if closed[current]:
+            continue
 
-        if current == goal_p:
+        if current == goal_index:
             path = []
-            while current is not None:
-                x, y = current
-                path.insert(0, Vector(x, y))
+            while current >= 0:
+                path.append((current % width, current // width))
                 current = came_from[current]
+            if current == FROM_OFF_MAP:
+                path.append(start)
+            path.reverse()
             return path
 
+        closed[current] = 1
+        expansions += 1
+        if max_expansions is not None and expansions > max_expansions:
+            # the next search for a goal it can't reach at all fails without searching
+            grid.components(game_object, allow_vents)
+            return None
+
+        new_cost = cost[current] + 1
         for dx, dy in DIRECTIONS:
-            nxt = (current[0] + dx, current[1] + dy)
-            vec = Vector(nxt[0], nxt[1])
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            nxt = ny * width + nx
+            if closed[nxt] or not passable[nxt]:
+                continue
+
+            if cost[nxt] == -1 or new_cost < cost[nxt]:
+                cost[nxt] = new_cost
+                came_from[nxt] = current
+                push(frontier, ((new_cost + abs(nx - goal_x) + abs(ny - goal_y)) * width + nx) * height + ny)
+
+    grid.components(game_object, allow_vents)
+    return None
+
+
+def target_distances(start: Position, targets: Iterable[Position], world, allow_vents: bool = True,
+                     game_object: GameObject | None = None, adjacent: bool = False,
+                     nearest_only: bool = False) -> Dict[Position, Tuple[int, ActionType | None]]:
+    """
+    Finds how far every target is from start with one breadth-first search, instead of one A* per target. Tiles are
+    passable for the mover the same way as in a_star_positions.
+
+    :param targets: the tiles to look for, such as ``Grid.of(world).positions(ObjectType.BATTERY_SPAWNER)``
+    :param adjacent: if True, a target counts as reached from any tile next to it, for things that are used from a
+        neighboring tile instead of stepped on (generators)
+    :param nearest_only: if True, stops at the first target found
+    :return: the distance to every target that can be reached and the first move toward it (None if it's already
+        there), nearest first; among targets as near as each other, the first move is toward the first one found
+    """
+    grid = Grid.of(world)
+    passable = grid.passability(game_object, allow_vents)
+    width, height = grid.width, grid.height
+    size = width * height
+
+    # the targets each tile reaches
+    watched: Dict[int, List[Position]] = {}
+    for target in targets:
+        x, y = target
+        if adjacent:
+            for dx, dy in DIRECTIONS:
+                if 0 <= x + dx < width and 0 <= y + dy < height:
+                    watched.setdefault((y + dy) * width + x + dx, []).append(target)
+        elif 0 <= x < width and 0 <= y < height:
+            watched.setdefault(y * width + x, []).append(target)
+
+    found: Dict[Position, Tuple[int, ActionType | None]] = {}
+    if not watched:
+        return found
+    remaining = len({target for reached in watched.values() for target in reached})
+
+    distances = [-1] * size
+    # the first move on the way to every tile, by its index in DIRECTIONS; -1 for the start
+    first_moves = [-1] * size
+    moves = [STEP_TO_MOVE[direction] for direction in DIRECTIONS]
+    queue: List[int] = []
+    start_x, start_y = start
+    if 0 <= start_x < width and 0 <= start_y < height:
+        distances[start_y * width + start_x] = 0
+        queue.append(start_y * width + start_x)
+    else:
+        for direction, (dx, dy) in enumerate(DIRECTIONS):
+            nx, ny = start_x + dx, start_y + dy
+            if 0 <= nx < width and 0 <= ny < height and passable[ny * width + nx]:
+                distances[ny * width + nx] = 1
+                first_moves[ny * width + nx] = direction
+                queue.append(ny * width + nx)
 
-            if game_object is not None and not world.can_object_occupy(vec, game_object):
+    head = 0
+    while head < len(queue):
+        index = queue[head]
+        head += 1
+
+        # tiles come out of the queue nearest first, so the first time a target is reached is the shortest way there
+        if index in watched:
+            for target in watched[index]:
+                if target not in found:
+                    first_move = first_moves[index]
+                    found[target] = (distances[index], moves[first_move] if first_move != -1 else None)
+                    remaining -= 1
+            if remaining == 0 or nearest_only:
+                break
+
+        x, y = index % width, index // width
+        next_distance = distances[index] + 1
+        for direction, (dx, dy) in enumerate(DIRECTIONS):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            neighbor = ny * width + nx
+            if distances[neighbor] != -1 or not passable[neighbor]:
                 continue
+            distances[neighbor] = next_distance
+            first_moves[neighbor] = first_moves[index] if first_moves[index] != -1 else direction
+            queue.append(neighbor)
+
+    return found
+
+def nearest_target(start: Position, targets: Iterable[Position], world, allow_vents: bool = True,
+                   game_object: GameObject | None = None,
+                   adjacent: bool = False) -> Optional[Tuple[Position, int, ActionType | None]]:
+    """
+    Same as target_distances, but only looks for the nearest target.
+    :return: the nearest target, its distance and the first move toward it; or None if no target can be reached
+    """
+    found = target_distances(start, targets, world, allow_vents, game_object, adjacent, nearest_only=True)
+    for target, (distance, move) in found.items():
+        return target, distance, move
+    return None
+
+
+class IncrementalPlanner:
+    """
+    `Incremental Planner Notes:`
+
+        Plans one mover's way to a goal turn after turn without starting over each time (D* Lite). The search runs
+        backward from the goal, and what it learned is kept between calls to ``plan``. When the mover has moved, the
+        goal has moved or tiles have changed (a door opened, a bot stepped somewhere), only the tiles those changes
+        touch are searched again, so a turn where little changed costs little however big the map is.
+
+        Keep one planner per mover (on the client, across turns) and call ``plan`` with the new world every turn. It
+        finds what changed by comparing the mover's passability layer to the one it saw last time.
+
+        A repair can still spread over much of the map, mostly when the goal jumps far. Once one expands more than
+        ``max_repair`` tiles, the planner drops what it has and searches from scratch instead. ``repairs`` and
+        ``full_searches`` count how often each happened, and ``expansions`` is how many tiles the last plan expanded.
+    """
+
+    # the cost of tiles that can't reach the goal (yet)
+    UNREACHABLE = 1 << 30
+
+    def __init__(self, allow_vents: bool = True, game_object: GameObject | None = None, max_repair: int | None = None):
+        """
+        :param max_repair: how many tiles a repair may expand before searching from scratch; the number of tiles on
+            the map if not given
+        """
+        self.allow_vents: bool = allow_vents
+        self.game_object: GameObject | None = game_object
+        self.max_repair: int | None = max_repair
+
+        self.width: int = 0
+        self.height: int = 0
+        self.passable: bytearray | None = None
+        self.start: int = -1
+        self.goal: int = -1
+        # where the start was when the keys in the queue were worked out, and how far it has moved since
+        self.last: int = -1
+        self.key_modifier: int = 0
+        self.g: List[int] = []
+        self.rhs: List[int] = []
+        self.keys: List[Tuple[int, int] | None] = []
+        self.queue: List[Tuple[int, int, int]] = []
+
+        self.repairs: int = 0
+        self.full_searches: int = 0
+        self.expansions: int = 0
+
+    def plan(self, start: Position, goal: Position, world) -> bool:
+        """
+        Brings the plan up to date with the world, the mover's position and the goal.
+        :return: whether the goal can be reached
+        """
+        grid = Grid.of(world)
+        return self.plan_layer(start, goal, grid.passability(self.game_object, self.allow_vents), grid.width,
+                               grid.height)
+
+    def plan_layer(self, start: Position, goal: Position, passable: bytearray, width: int, height: int) -> bool:
+        """
+        Same as ``plan``, against a passability layer (indexed by ``y * width + x``) instead of a world.
+        """
+        if not (0 <= start[0] < width and 0 <= start[1] < height and 0 <= goal[0] < width and 0 <= goal[1] < height):
+            self.passable = None
+            return False
+        start_index = start[1] * width + start[0]
+        goal_index = goal[1] * width + goal[0]
+        self.expansions = 0
+
+        if self.passable is None or (width, height) != (self.width, self.height):
+            self.__search_from_scratch(start_index, goal_index, passable, width, height)
+            return self.g[start_index] < self.UNREACHABLE
+
+        self.repairs += 1
+        self.key_modifier += self.__heuristic(self.last, start_index)
+        self.last = self.start = start_index
+
+        if goal_index != self.goal:
+            old_goal, self.goal = self.goal, goal_index
+            self.rhs[goal_index] = 0
+            self.__update_vertex(goal_index)
+            self.rhs[old_goal] = self.__lowest_cost(old_goal)
+            self.__update_vertex(old_goal)
+
+        if passable != self.passable:
+            old_passable, self.passable = self.passable, bytearray(passable)
+            for index, (before, after) in enumerate(zip(old_passable, passable)):
+                if before != after:
+                    self.__tile_changed(index)
+
+        if not self.__compute_shortest_path(self.max_repair if self.max_repair is not None else width * height):
+            self.__search_from_scratch(start_index, goal_index, passable, width, height)
+        return self.g[start_index] < self.UNREACHABLE
+
+    def distance(self) -> int | None:
+        """
+        :return: the number of steps from the start to the goal as of the last plan, or None if it can't get there
+        """
+        if self.passable is None or self.g[self.start] >= self.UNREACHABLE:
+            return None
+        return self.g[self.start]
 
-            if not world.is_valid_coords(vec):
+    def next_position(self) -> Position | None:
+        """
+        :return: the next tile on the way to the goal as of the last plan, or None if there isn't one
+        """
+        if self.passable is None:
+            return None
+        index = self.__next_index(self.start)
+        return (index % self.width, index // self.width) if index is not None else None
+
+    def path(self) -> List[Position] | None:
+        """
+        :return: the tiles from the start to the goal (both included) as of the last plan, or None if it can't get
+            there
+        """
+        if self.distance() is None:
+            return None
+        width = self.width
+        index = self.start
+        path = [(index % width, index // width)]
+        while index != self.goal:
+            index = self.__next_index(index)
+            path.append((index % width, index // width))
+        return path
+
+    def next_move(self, start: Position, goal: Position, world) -> ActionType | None:
+        """
+        Plans (see ``plan``) and returns the first move toward the goal, or None if there isn't one.
+        """
+        if not self.plan(start, goal, world):
+            return None
+        position = self.next_position()
+        if position is None:
+            return None
+        return STEP_TO_MOVE.get((position[0] - start[0], position[1] - start[1]))
+
+    def __next_index(self, index: int) -> int | None:
+        # the neighbor that is cheapest to go on from (the first one in DIRECTIONS if there are several)
+        if index == self.goal:
+            return None
+        width, height, g, passable = self.width, self.height, self.g, self.passable
+        x, y = index % width, index // width
+        best, best_cost = None, self.UNREACHABLE
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height) or not passable[ny * width + nx]:
                 continue
+            if g[ny * width + nx] + 1 < best_cost:
+                best, best_cost = ny * width + nx, g[ny * width + nx] + 1
+        return best
+
+    def __search_from_scratch(self, start: int, goal: int, passable: bytearray, width: int, height: int) -> None:
+        self.full_searches += 1
+        self.width, self.height = width, height
+        self.passable = bytearray(passable)
+        self.start = self.last = start
+        self.goal = goal
+        self.key_modifier = 0
+        self.g = [self.UNREACHABLE] * (width * height)
+        self.rhs = [self.UNREACHABLE] * (width * height)
+        self.keys = [None] * (width * height)
+        self.queue = []
+
+        self.rhs[goal] = 0
+        self.__update_vertex(goal)
+        self.__compute_shortest_path(None)
+
+    def __heuristic(self, a: int, b: int) -> int:
+        width = self.width
+        return abs(a % width - b % width) + abs(a // width - b // width)
+
+    def __key(self, index: int) -> Tuple[int, int]:
+        cost = min(self.g[index], self.rhs[index])
+        return cost + self.__heuristic(self.start, index) + self.key_modifier, cost
+
+    def __update_vertex(self, index: int) -> None:
+        # only tiles whose cost is out of date wait in the queue; entries with an old key are skipped when popped
+        if self.g[index] != self.rhs[index]:
+            key = self.keys[index] = self.__key(index)
+            heapq.heappush(self.queue, (key[0], key[1], index))
+        else:
+            self.keys[index] = None
+
+    def __lowest_cost(self, index: int) -> int:
+        # the cost of going on from the tile: one step onto a passable neighbor, plus that neighbor's cost
+        if index == self.goal:
+            return 0
+        width, height, g, passable = self.width, self.height, self.g, self.passable
+        x, y = index % width, index // width
+        lowest = self.UNREACHABLE
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height and passable[ny * width + nx]:
+                lowest = min(lowest, g[ny * width + nx] + 1)
+        return min(lowest, self.UNREACHABLE)
 
-            top = world.get_top(vec)
-            if top and top.object_type != ObjectType.AVATAR:
-                # walls block
-                if top.object_type == ObjectType.WALL:
+    def __refresh_links(self, gate: int) -> None:
+        """
+        Works out the gate's links with the bots where they are now. A blocked tile is on as many shortest ways from
+        one gate to another as there are shortest ways to it from both gates multiplied (none if its steps from both
+        don't add up to the steps between them). While the blocked tiles are on fewer ways than there are, one of them
+        is still free and the link without bots holds; only otherwise are the rooms walked again.
+        """
+        self.stale_gates.discard(gate)
+        distances, counts = self.gate_distances[gate], self.gate_path_counts[gate]
+        in_the_way = [(tile, distances[tile], counts[tile]) for tile in self.blocked_tiles if tile in distances]
+        for other, steps, paths in self.static_links[gate]:
+            other_distances, other_counts = self.gate_distances[other], self.gate_path_counts[other]
+            blocked_paths = sum(count * other_counts[tile] for tile, steps_here, count in in_the_way
+                                if steps_here + other_distances.get(tile, self.UNREACHABLE) == steps)
+            if blocked_paths >= paths:
+                self.links[gate] = list(self.__reach(gate)[1].items())
+                return
+        self.links[gate] = [(other, steps) for other, steps, _ in self.static_links[gate]]
+
+    def __count_paths(self, origin: int) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """
+        Walks out from the tile like ``__reach``, counting the shortest ways to every walkable tile it gets to.
+        :return: the steps to every tile, and how many shortest ways there are to it
+        """
+        width, height, walkable = self.width, self.height, self.walkable
+        distances = {origin: 0}
+        counts = {origin: 1}
+        queue = [origin]
+        head = 0
+        while head < len(queue):
+            index = queue[head]
+            head += 1
+            x, y = index % width, index // width
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                neighbor = ny * width + nx
+                if not walkable[neighbor]:
                     continue
+                if neighbor not in distances:
+                    distances[neighbor] = distances[index] + 1
+                    counts[neighbor] = counts[index]
+                    queue.append(neighbor)
+                elif distances[neighbor] == distances[index] + 1:
+                    counts[neighbor] += counts[index]
+        return distances, counts
+
+    def __paths_to(self, gate: int, other: int, steps: int) -> int:
+        """
+        :return: how many shortest ways of ``steps`` steps there are from one gate to the other, with no bots in the way
+        """
+        distances, counts = self.gate_distances[gate], self.gate_path_counts[gate]
+        return sum(counts[neighbor] for neighbor in self.__neighbors(other) if distances.get(neighbor) == steps - 1)
+
+    def __neighbors(self, index: int) -> List[int]:
+        width, height = self.width, self.height
+        x, y = index % width, index // width
+        return [ny * width + nx for nx, ny in ((x + dx, y + dy) for dx, dy in DIRECTIONS)
+                if 0 <= nx < width and 0 <= ny < height]
+
+    def __tile_changed(self, index: int) -> None:
+        # stepping onto the tile got cheaper or dearer, which only changes what its neighbors cost
+        for neighbor in self.__neighbors(index):
+            self.rhs[neighbor] = self.__lowest_cost(neighbor)
+            self.__update_vertex(neighbor)
+
+    def __compute_shortest_path(self, limit: int | None) -> bool:
+        """
+        :return: False if it gave up after expanding ``limit`` tiles
+        """
+        g, rhs, keys, queue, passable = self.g, self.rhs, self.keys, self.queue, self.passable
+        start = self.start
+        expanded = 0
+        while queue:
+            k1, k2, index = queue[0]
+            if keys[index] != (k1, k2):
+                heapq.heappop(queue)
+                continue
+            if (k1, k2) >= self.__key(start) and rhs[start] == g[start]:
+                break
+
+            expanded += 1
+            self.expansions += 1
+            if limit is not None and expanded > limit:
+                return False
+
+            heapq.heappop(queue)
+            new_key = self.__key(index)
+            if (k1, k2) < new_key:
+                keys[index] = new_key
+                heapq.heappush(queue, (new_key[0], new_key[1], index))
+            elif g[index] > rhs[index]:
+                g[index] = rhs[index]
+                keys[index] = None
+                if passable[index]:
+                    for neighbor in self.__neighbors(index):
+                        if neighbor != self.goal and g[index] + 1 < rhs[neighbor]:
+                            rhs[neighbor] = g[index] + 1
+                            self.__update_vertex(neighbor)
+            else:
+                old_cost = g[index]
+                g[index] = self.UNREACHABLE
+                # the tiles that went on through this one have to look for another way
+                neighbors = self.__neighbors(index) if passable[index] else []
+                for neighbor in [index, *neighbors]:
+                    if neighbor != self.goal and (neighbor == index or rhs[neighbor] == old_cost + 1):
+                        rhs[neighbor] = self.__lowest_cost(neighbor)
+                    self.__update_vertex(neighbor)
+        return True
+
 
-                # vents block unless allowed
-                if top.object_type == ObjectType.VENT and not allow_vents:
+class RoomGraph:
+    """
+    `Room Graph Notes:`
+
+        A two-level view of the map for long searches (HPA*). Tiles whose passability can change during a game
+        (doors, vents and refuges) are gates; the rest of the map the mover can walk on, counting the tiles bots stand
+        on, is split into rooms, the areas that can be walked between without passing a gate. When the graph is built,
+        every gate gets the distances to the gates it can reach through the rooms next to it, so a search only walks
+        the rooms it starts and ends in and hops from gate to gate everywhere else.
+
+        Opening or closing a gate only flips whether it can be entered. Bots move every turn, so the tiles they block
+        (``blocked``) are kept apart from the rooms. When they move, only the gates next to the rooms they left or
+        entered are marked stale, and the distances out of a stale gate are worked out again the first time a search
+        gets to it, so gates no search reaches cost nothing. ``update`` reads both from a new world, ``set_gate``
+        flips one gate. Paths are as short as A*'s on the passability layer of the world last read.
+    """
+
+    UNREACHABLE = 1 << 30
+
+    def __init__(self, world, game_object: GameObject | None = None, allow_vents: bool = True):
+        grid = Grid.of(world)
+        self.game_object: GameObject | None = game_object
+        self.allow_vents: bool = allow_vents
+        self.width: int = grid.width
+        self.height: int = grid.height
+        size = self.width * self.height
+        layer = grid.passability(game_object, allow_vents)
+        # the tiles next to every tile, worked out once for all the walks through the rooms
+        self.adjacent: List[List[int]] = [self.__neighbors(index) for index in range(size)]
+
+        self.is_gate: bytearray = bytearray(size)
+        for object_type in GATE_TYPES:
+            for x, y in grid.positions(object_type):
+                self.is_gate[y * self.width + x] = 1
+        self.gates: List[int] = [index for index in range(size) if self.is_gate[index]]
+        # whether each gate can be entered right now
+        self.open: bytearray = bytearray(size)
+        for gate in self.gates:
+            self.open[gate] = layer[gate]
+        # bots only ever stand on floor, so their tiles belong to the rooms; they are blocked for as long as they stay
+        under_bot = bytearray(size)
+        for object_type in BOT_OBJECT_TYPES:
+            for x, y in grid.positions(object_type):
+                under_bot[y * self.width + x] = 1
+        self.walkable: bytearray = bytearray((layer[index] or under_bot[index]) and not self.is_gate[index]
+                                             for index in range(size))
+        # the walkable tiles that can't be walked on right now
+        self.blocked: bytearray = bytearray(size)
+
+        # the room of every walkable tile, -1 everywhere else
+        self.rooms: List[int] = [-1] * size
+        self.room_count: int = 0
+        for index in range(size):
+            if self.walkable[index] and self.rooms[index] == -1:
+                for tile in self.__reach(index)[0]:
+                    self.rooms[tile] = self.room_count
+                self.room_count += 1
+
+        # the steps from every gate to the tiles of the rooms next to it, and how many shortest ways there are to
+        # each, with no bots in the way
+        self.gate_distances: Dict[int, Dict[int, int]] = {}
+        self.gate_path_counts: Dict[int, Dict[int, int]] = {}
+        for gate in self.gates:
+            self.gate_distances[gate], self.gate_path_counts[gate] = self.__count_paths(gate)
+        # the gates every gate can get to without passing another one, how many steps it takes and how many shortest
+        # ways there are, with no bots in the way
+        self.static_links: Dict[int, List[Tuple[int, int, int]]] = {
+            gate: [(other, steps, self.__paths_to(gate, other, steps))
+                   for other, steps in self.__reach(gate)[1].items()]
+            for gate in self.gates}
+        # the gates every gate can get to and how many steps it takes, with the bots where they are now
+        self.links: Dict[int, List[Tuple[int, int]]] = {gate: [(other, steps) for other, steps, _ in links]
+                                                          for gate, links in self.static_links.items()}
+        # the gates next to every room, whose links go through it
+        self.room_gates: Dict[int, List[int]] = {}
+        for gate in self.gates:
+            for room in {self.rooms[neighbor] for neighbor in self.adjacent[gate] if self.walkable[neighbor]}:
+                self.room_gates.setdefault(room, []).append(gate)
+        # the gates whose links are out of date, worked out again when a search gets to them
+        self.stale_gates: set = set()
+        self.blocked_tiles: List[int] = []
+        self.__read_blockers(layer)
+
+    def update(self, world) -> int:
+        """
+        Reads whether every gate can be entered, and which tiles bots block, from the world.
+        :return: how many gates changed
+        """
+        layer = Grid.of(world).passability(self.game_object, self.allow_vents)
+        changed = 0
+        for gate in self.gates:
+            if self.open[gate] != layer[gate]:
+                self.open[gate] = layer[gate]
+                changed += 1
+        self.__read_blockers(layer)
+        return changed
+
+    def set_gate(self, x: int, y: int, is_open: bool) -> None:
+        index = y * self.width + x
+        if not self.is_gate[index]:
+            raise ValueError(f'({x}, {y}) is not a gate')
+        self.open[index] = is_open
+
+    def distance(self, start: Position, goal: Position) -> int | None:
+        """
+        :return: the number of steps from start to goal, or None if it can't get there
+        """
+        found = self.__search(start, goal)
+        return found[0] if found is not None else None
+
+    def path(self, start: Position, goal: Position) -> List[Position] | None:
+        """
+        :return: the tiles from start to goal (both included), or None if it can't get there
+        """
+        if start == goal:
+            return [start]
+        found = self.__search(start, goal)
+        if found is None:
+            return None
+        _, last_gate, came_from = found
+        width = self.width
+        goal_index = goal[1] * width + goal[0]
+
+        # the gates along the way, then the walks through the rooms between them
+        stops = [goal_index] if last_gate != goal_index else []
+        gate = last_gate
+        while gate is not None:
+            stops.append(gate)
+            gate = came_from[gate]
+        stops.reverse()
+
+        path = [start]
+        current = start[1] * width + start[0]
+        for stop in stops:
+            path.extend((index % width, index // width) for index in self.__walk(current, stop))
+            current = stop
+        return path
+
+    def __search(self, start: Position, goal: Position) -> Tuple[int, int | None, Dict[int, int | None]] | None:
+        """
+        :return: the distance, the last gate on the way (None if there isn't one, the goal if it's a gate) and the
+            gate before every gate on the way; or None if the goal can't be reached
+        """
+        width, height = self.width, self.height
+        if not (0 <= start[0] < width and 0 <= start[1] < height and 0 <= goal[0] < width and 0 <= goal[1] < height):
+            return None
+        if start == goal:
+            return 0, None, {}
+        start_index = start[1] * width + start[0]
+        goal_index = goal[1] * width + goal[0]
+
+        start_distances, start_gates = self.__reach(start_index)
+        if self.is_gate[goal_index]:
+            if not self.open[goal_index]:
+                return None
+            goal_gates = {goal_index: 0}
+        elif self.walkable[goal_index] and not self.blocked[goal_index]:
+            goal_gates = self.__reach(goal_index)[1]
+        else:
+            return None
+
+        # straight there through the start's room, if it's in the same one
+        best = start_distances.get(goal_index, self.UNREACHABLE)
+        best_gate = None
+
+        came_from: Dict[int, int | None] = {}
+        costs: Dict[int, int] = {}
+        frontier: List[Tuple[int, int]] = []
+        for gate, cost in start_gates.items():
+            if self.open[gate]:
+                costs[gate] = cost
+                came_from[gate] = None
+                frontier.append((cost, gate))
+        heapq.heapify(frontier)
+
+        while frontier:
+            cost, gate = heapq.heappop(frontier)
+            if cost >= best:
+                break
+            if cost > costs[gate]:
+                continue
+            if gate in goal_gates and cost + goal_gates[gate] < best:
+                best = cost + goal_gates[gate]
+                best_gate = gate
+            if gate in self.stale_gates:
+                self.__refresh_links(gate)
+            for other, steps in self.links[gate]:
+                if self.open[other] and cost + steps < costs.get(other, self.UNREACHABLE):
+                    costs[other] = cost + steps
+                    came_from[other] = gate
+                    heapq.heappush(frontier, (cost + steps, other))
+
+        if best >= self.UNREACHABLE:
+            return None
+        return best, best_gate, came_from
+
+    def __read_blockers(self, layer: bytearray) -> None:
+        """
+        Marks the walkable tiles the passability layer doesn't let the mover on as blocked, and the gates next to the
+        rooms where that changed as stale.
+        """
+        walkable, old = self.walkable, self.blocked
+        blocked = bytearray(walkable[index] and not layer[index] for index in range(self.width * self.height))
+        if blocked == old:
+            return
+        self.blocked = blocked
+        self.blocked_tiles = [index for index in range(len(blocked)) if blocked[index]]
+        rooms = self.rooms
+        for room in {rooms[index] for index in range(len(blocked)) if blocked[index] != old[index]}:
+            self.stale_gates.update(self.room_gates.get(room, ()))
+
+    def __refresh_links(self, gate: int) -> None:
+        """
+        Works out the gate's links with the bots where they are now. A blocked tile is on as many shortest ways from
+        one gate to another as there are shortest ways to it from both gates multiplied (none if its steps from both
+        don't add up to the steps between them). While the blocked tiles are on fewer ways than there are, one of them
+        is still free and the link without bots holds. The rooms are only walked again for the links that don't, and
+        only until those gates are found.
+        """
+        self.stale_gates.discard(gate)
+        distances, counts = self.gate_distances[gate], self.gate_path_counts[gate]
+        in_the_way = [(tile, distances[tile], counts[tile]) for tile in self.blocked_tiles if tile in distances]
+        cut_off = set()
+        for other, steps, paths in self.static_links[gate]:
+            other_distances, other_counts = self.gate_distances[other], self.gate_path_counts[other]
+            blocked_paths = sum(count * other_counts[tile] for tile, steps_here, count in in_the_way
+                                if steps_here + other_distances.get(tile, self.UNREACHABLE) == steps)
+            if blocked_paths >= paths:
+                cut_off.add(other)
+
+        found = self.__reach(gate, cut_off)[1] if cut_off else {}
+        self.links[gate] = [(other, found[other] if other in cut_off else steps)
+                            for other, steps, _ in self.static_links[gate] if other not in cut_off or other in found]
+
+    def __count_paths(self, origin: int) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """
+        Walks out from the tile like ``__reach``, counting the shortest ways to every walkable tile it gets to.
+        :return: the steps to every tile, and how many shortest ways there are to it
+        """
+        adjacent, walkable = self.adjacent, self.walkable
+        distances = {origin: 0}
+        counts = {origin: 1}
+        queue = [origin]
+        head = 0
+        while head < len(queue):
+            index = queue[head]
+            head += 1
+            for neighbor in adjacent[index]:
+                if not walkable[neighbor]:
                     continue
+                if neighbor not in distances:
+                    distances[neighbor] = distances[index] + 1
+                    counts[neighbor] = counts[index]
+                    queue.append(neighbor)
+                elif distances[neighbor] == distances[index] + 1:
+                    counts[neighbor] += counts[index]
+        return distances, counts
+
+    def __paths_to(self, gate: int, other: int, steps: int) -> int:
+        """
+        :return: how many shortest ways of ``steps`` steps there are from one gate to the other, with no bots in the way
+        """
+        distances, counts = self.gate_distances[gate], self.gate_path_counts[gate]
+        return sum(counts[neighbor] for neighbor in self.adjacent[other] if distances.get(neighbor) == steps - 1)
+
+    def __neighbors(self, index: int) -> List[int]:
+        x, y = index % self.width, index // self.width
+        return [(y + dy) * self.width + x + dx for dx, dy in DIRECTIONS
+                if 0 <= x + dx < self.width and 0 <= y + dy < self.height]
+
+    def __reach(self, origin: int, targets: set | None = None) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """
+        Walks out from the tile through the walkable tiles it can get to without passing a gate or a blocked tile.
+        :param targets: if given, gates to stop at once every one of them is found
+        :return: the steps to every walkable tile it got to (and the tile itself), and to every gate next to them
+        """
+        adjacent, walkable, blocked, is_gate = self.adjacent, self.walkable, self.blocked, self.is_gate
+        left = len(targets) if targets else -1
+        distances = {origin: 0}
+        gates: Dict[int, int] = {}
+        queue = [origin]
+        head = 0
+        while head < len(queue):
+            index = queue[head]
+            head += 1
+            for neighbor in adjacent[index]:
+                if walkable[neighbor]:
+                    if neighbor not in distances and not blocked[neighbor]:
+                        distances[neighbor] = distances[index] + 1
+                        queue.append(neighbor)
+                elif is_gate[neighbor] and neighbor != origin and neighbor not in gates:
+                    gates[neighbor] = distances[index] + 1
+                    if targets and neighbor in targets:
+                        left -= 1
+                        if not left:
+                            return distances, gates
+        return distances, gates
 
-                # can't pass through non-occupiable
-                if not isinstance(top, Occupiable):
+    def __walk(self, origin: int, target: int) -> List[int]:
+        """
+        :return: the tiles after ``origin`` up to and including ``target``, the shortest way through walkable tiles
+            that aren't blocked
+        """
+        width, height, walkable, blocked = self.width, self.height, self.walkable, self.blocked
+        came_from = {origin: -1}
+        queue = [origin]
+        head = 0
+        while head < len(queue):
+            index = queue[head]
+            head += 1
+            x, y = index % width, index // width
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
                     continue
+                neighbor = ny * width + nx
+                if neighbor in came_from or not (walkable[neighbor] and not blocked[neighbor] or neighbor == target):
+                    continue
+                came_from[neighbor] = index
+                if neighbor == target:
+                    tiles = []
+                    while neighbor != origin:
+                        tiles.append(neighbor)
+                        neighbor = came_from[neighbor]
+                    tiles.reverse()
+                    return tiles
+                queue.append(neighbor)
+        return []
 
-            new_cost = cost[current] + 1
-            if nxt not in cost or new_cost < cost[nxt]:
-                cost[nxt] = new_cost
-                priority = new_cost + vec.distance(goal)
-                heapq.heappush(frontier, (priority, nxt))
-                came_from[nxt] = current
 
-    return None
\ No newline at end of file
+class PathCache:
+    """
+    `Path Cache Notes:`
+
+        Remembers the paths a_star_positions found across turns. Most of the map stays the same from turn to turn, so
+        a path between the same two tiles usually comes out the same, and a client that keeps one PathCache around
+        can answer repeated questions (the way from a generator to the nearest refuge, say) without searching again.
+
+        Paths are kept by start, goal, mover (see ``Grid.mover_key``) and the state of every door, vent and refuge
+        for the mover (``Grid.gate_fingerprint``), so opening a door starts a new set of paths. Other things that
+        block tiles, like bots, are not part of the key. Instead, a path is checked against the world before it is
+        handed out: if a tile on it can't be passed anymore (or the goal of a remembered failure can be reached now),
+        it is searched for again. A path that is still clear is handed out even if a shorter one opened up that way.
+
+        At most ``max_entries`` paths are kept, dropping the one used longest ago. ``hits``, ``misses`` (including
+        ``stale`` entries that failed the check) and ``evictions`` count what happened.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        if max_entries < 1:
+            raise ValueError(f'max_entries must be at least 1. It is {max_entries}.')
+        self.max_entries: int = max_entries
+        # a dict keeps the order entries went in, so the first one is always the one used longest ago
+        self.entries: Dict[tuple, Tuple[Position, ...] | None] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stale: int = 0
+        self.evictions: int = 0
+
+    def path(self, start: Position, goal: Position, world, allow_vents: bool = True,
+             game_object: GameObject | None = None) -> Optional[List[Position]]:
+        """
+        Same as a_star_positions, from the cache when possible.
+        """
+        grid = Grid.of(world)
+        key = (start, goal, Grid.mover_key(game_object, allow_vents), grid.gate_fingerprint(game_object, allow_vents))
+
+        if key in self.entries:
+            path = self.entries.pop(key)
+            if self.__still_valid(grid, path, start, goal, game_object, allow_vents):
+                self.hits += 1
+                self.entries[key] = path
+                return list(path) if path is not None else None
+            self.stale += 1
+
+        self.misses += 1
+        found = a_star_positions(start, goal, world, allow_vents, game_object)
+        self.entries[key] = tuple(found) if found is not None else None
+        if len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+            self.evictions += 1
+        return found
+
+    def distance(self, start: Position, goal: Position, world, allow_vents: bool = True,
+                 game_object: GameObject | None = None) -> int | None:
+        """
+        :return: the number of steps from start to goal, or None if it can't get there
+        """
+        path = self.path(start, goal, world, allow_vents, game_object)
+        return len(path) - 1 if path is not None else None
+
+    def move(self, start: Vector, goal: Vector, world, allow_vents: bool = True,
+             game_object: GameObject | None = None) -> ActionType | None:
+        """
+        Same as a_star_move, from the cache when possible.
+        """
+        path = self.path((start.x, start.y), (goal.x, goal.y), world, allow_vents, game_object)
+        if not path or len(path) < 2:
+            return None
+        return STEP_TO_MOVE.get((path[1][0] - start.x, path[1][1] - start.y))
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    @staticmethod
+    def __still_valid(grid: Grid, path: Tuple[Position, ...] | None, start: Position, goal: Position,
+                      game_object: GameObject | None, allow_vents: bool) -> bool:
+        if path is None:
+            return not grid.can_reach(start, goal, game_object, allow_vents)
+        passable = grid.passability(game_object, allow_vents)
+        width = grid.width
+        return all(passable[y * width + x] for x, y in path[1:])
@@ -0,0 +1,97 @@
+import time
+from typing import Any, Callable
+
+
+class PhaseProfiler:
+    """
+    `Phase Profiler Notes:`
+
+        Accumulates the wall time (``time.perf_counter_ns``) and number of calls of named phases of a game. A phase is
+        timed by wrapping a method with ``wrap``; the wrapper is set on the given owner, so wrapping a controller
+        instance only times that instance, and wrapping a class times every instance of it. ``restore`` puts every
+        wrapped method back.
+
+        Classes should only be wrapped when their instances are never copied or pickled while wrapped, or when the
+        class itself is wrapped; a wrapper set on an instance goes wherever the instance goes.
+    """
+
+    def __init__(self):
+        self.total_ns: dict[str, int] = {}
+        self.calls: dict[str, int] = {}
+        self.__wrapped: list[tuple[Any, str, Any | None]] = []
+
+    def add(self, phase: str, elapsed_ns: int) -> None:
+        self.total_ns[phase] = self.total_ns.get(phase, 0) + elapsed_ns
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def wrap(self, owner: Any, name: str, phase: str) -> None:
+        """
+        Replaces ``owner.<name>`` with a wrapper that adds the time of every call to ``phase``.
+        """
+        original: Callable = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter_ns() - start)
+
+        # remember what was set on the owner itself so restore doesn't leave an inherited method behind on it
+        self.__wrapped.append((owner, name, vars(owner).get(name)))
+        setattr(owner, name, timed)
+
+    def restore(self) -> None:
+        for owner, name, original in reversed(self.__wrapped):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.__wrapped.clear()
+
+    def to_json(self) -> dict:
+        return {phase: {'total_ns': self.total_ns[phase], 'calls': self.calls[phase]} for phase in self.total_ns}
+
+
+def merge_profiles(profiles: list[dict]) -> dict:
+    """
+    Adds up the ``PhaseProfiler.to_json`` data of several games.
+    """
+    merged: dict[str, dict[str, int]] = {}
+    for profile in profiles:
+        for phase, timing in profile.items():
+            total = merged.setdefault(phase, {'total_ns': 0, 'calls': 0})
+            total['total_ns'] += timing['total_ns']
+            total['calls'] += timing['calls']
+    return merged
+
+
+def profile_summary(profile: dict, ticks: int) -> dict:
+    """
+    Turns summed phase timings into what ``profile.json`` stores for each phase: the total time, the number of calls,
+    the mean time per call and per tick, and the phase's share of the total time of all phases.
+    """
+    all_ns = sum(timing['total_ns'] for timing in profile.values()) or 1
+    summary = {}
+    for phase, timing in sorted(profile.items(), key=lambda item: item[1]['total_ns'], reverse=True):
+        summary[phase] = {
+            'total_ms': timing['total_ns'] / 1e6,
+            'calls': timing['calls'],
+            'mean_us_per_call': timing['total_ns'] / timing['calls'] / 1e3 if timing['calls'] else 0.0,
+            'mean_us_per_tick': timing['total_ns'] / ticks / 1e3 if ticks else 0.0,
+            'percent': 100 * timing['total_ns'] / all_ns,
+        }
+    return summary
+
+
+def format_summary(summary: dict) -> str:
+    """
+    Formats the output of ``profile_summary`` as a table, slowest phase first.
+    """
+    width = max([len('phase')] + [len(phase) for phase in summary])
+    lines = [f'{"phase":<{width}}  {"total ms":>10}  {"calls":>8}  {"us/call":>9}  {"us/tick":>9}  {"%":>5}']
+    for phase, timing in summary.items():
+        lines.append(f'{phase:<{width}}  {timing["total_ms"]:>10.1f}  {timing["calls"]:>8}  '
+                     f'{timing["mean_us_per_call"]:>9.1f}  {timing["mean_us_per_tick"]:>9.1f}  '
+                     f'{timing["percent"]:>5.1f}')
+    return '\n'.join(lines)
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+# puts the engine from launcher.pyz on the path
+import batch
+from batch import board_to_json, build_game_board, run_batch, snapshot_board, state_path, wall_layer
+from game.common.enums import ObjectType
+from game.common.map.occupiable import Occupiable
+
+
+class SnapshotBoardTest(unittest.TestCase):
+    def test_copies_are_whole_and_independent(self):
+        board = build_game_board(1)
+        walls = wall_layer(board)
+        first, second = snapshot_board(board, walls), snapshot_board(board, walls)
+        self.assertEqual(board_to_json(first), board_to_json(board))
+        self.assertEqual(list(first.game_map), list(board.game_map))
+
+        # a client may change its own copy however it likes, walls included
+        position = next(position for position, container in board.game_map.items() if id(container) in walls[0])
+        self.assertIsNotNone(first.remove(position, ObjectType.WALL))
+        self.assertTrue(first.place(position, Occupiable()))
+        self.assertIs(second.get_top(position).object_type, ObjectType.WALL)
+        self.assertIs(board.get_top(position).object_type, ObjectType.WALL)
+        self.assertIs(snapshot_board(board, walls).get_top(position).object_type, ObjectType.WALL)
+
+
+IDLE_CLIENT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks',
+                           'idle_client.py')
+
+
+def without_latency(results: list[dict]) -> list[dict]:
+    for result in results:
+        for player in result['players']:
+            player.pop('turn_latency', None)
+    return results
+
+
+class SaveStateTest(unittest.TestCase):
+    def test_resumed_games_match_uninterrupted_ones(self):
+        # the idle client never draws from its RNG, so the saved and resumed games only depend on the engine; idle, the
+        # avatar runs out of power on tick 100
+        last_tick = 100
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                # without state_dir, the states go where the command line puts them
+                uninterrupted = run_batch(IDLE_CLIENT, [3], jobs=1, save_ticks=[50, last_tick])
+                paths = [state_path(os.path.join(batch.OUTPUT_DIR, 'states'), 3, tick)
+                         for tick in (50, last_tick)]
+                resumed = run_batch(IDLE_CLIENT, [], jobs=1, states=paths)
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(uninterrupted[0]['ticks'], last_tick)
+        # the last state was saved on the tick the game ended, so there's nothing left to play after it
+        self.assertEqual(without_latency(resumed), without_latency(uninterrupted * 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
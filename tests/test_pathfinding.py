@@ -0,0 +1,303 @@
+import random
+import unittest
+
+# puts the engine from launcher.pyz on the path
+import batch
+from batch import build_game_board, snapshot
+from game.common.enums import ActionType, ObjectType
+from game.common.map.wall import Wall
+from game.utils.vector import Vector
+from pathfinding import (DIRECTIONS, STEP_TO_MOVE, DistanceField, Grid, IncrementalPlanner, PathCache, RoomGraph,
+                         a_star_positions, nearest_target, target_distances)
+from vec_env import Game
+
+MOVES = [ActionType.MOVE_UP, ActionType.MOVE_DOWN, ActionType.MOVE_LEFT, ActionType.MOVE_RIGHT,
+         ActionType.INTERACT_CENTER]
+
+
+class GridTest(unittest.TestCase):
+    def test_invalidate_after_changing_the_world(self):
+        world = build_game_board(1)
+        start, goal = (1, 1), (36, 18)
+        path = a_star_positions(start, goal, world)
+        self.assertIsNotNone(path)
+
+        # wall off a tile halfway along the path, in place
+        for x, y in path[len(path) // 2:-1]:
+            if world.place(Vector(x, y), Wall()):
+                blocked = (x, y)
+                break
+        else:
+            self.fail('nowhere on the path to place a wall')
+        self.assertIn(blocked, a_star_positions(start, goal, world))
+
+        Grid.invalidate()
+        rebuilt = a_star_positions(start, goal, world)
+        self.assertNotIn(blocked, rebuilt)
+        grid = Grid(world)
+        self.assertEqual(len(rebuilt) - 1, DistanceField(grid, goal, grid.passability()).distance(*start))
+
+    def test_update_a_tile_that_started_empty(self):
+        world = build_game_board(1)
+        grid = Grid(world)
+        layer = grid.passability()
+        x, y = next((x, y) for y in range(grid.height) for x in range(grid.width)
+                    if grid.get(x, y) is None and layer[y * grid.width + x])
+
+        self.assertTrue(world.place(Vector(x, y), Wall()))
+        grid.update(x, y)
+        self.assertFalse(layer[y * grid.width + x])
+        self.assertTrue(grid.has(x, y, ObjectType.WALL))
+        self.assertIsNotNone(grid.get(x, y))
+
+    def test_components_are_only_labelled_after_a_failed_search(self):
+        world = build_game_board(1)
+        grid = Grid.of(world)
+        layer = grid.passability()
+        free = [(x, y) for y in range(grid.height) for x in range(grid.width) if layer[y * grid.width + x]]
+        self.assertIsNotNone(a_star_positions(free[0], free[1], world))
+        self.assertFalse(grid.components_by_layer)
+
+        # a tile fenced in by walls on every side can't be reached from anywhere
+        x, y = next((x, y) for x, y in free if 0 < x < grid.width - 1 and 0 < y < grid.height - 1)
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            world.place(Vector(x + dx, y + dy), Wall())
+        Grid.invalidate()
+        grid = Grid.of(world)
+        start = next(tile for tile in free if abs(tile[0] - x) + abs(tile[1] - y) > 1)
+        self.assertIsNone(a_star_positions(start, (x, y), world))
+        self.assertTrue(grid.known_unreachable(start, (x, y)))
+
+
+class IncrementalPlannerTest(unittest.TestCase):
+    """
+    Moves a start and a goal around a map while tiles open and close, and checks every plan against a breadth-first
+    search (DistanceField) over the same layer.
+    """
+
+    def test_plans_match_search(self):
+        # seed 2 plans without vents, seed 3 caps how much a repair may expand before searching from scratch
+        for seed, allow_vents, max_repair in ((1, True, None), (2, False, None), (3, True, 40)):
+            grid = Grid(build_game_board(seed))
+            width, height = grid.width, grid.height
+            base = bytearray(grid.passability(None, allow_vents))
+            layer = bytearray(base)
+            rnd = random.Random(seed)
+            planner = IncrementalPlanner(allow_vents, max_repair=max_repair)
+            free = [index for index in range(width * height) if base[index]]
+            start, goal = rnd.choice(free), rnd.choice(free)
+            start_x, start_y = start % width, start // width
+            goal_x, goal_y = goal % width, goal // width
+
+            for _ in range(400):
+                for _ in range(rnd.randrange(3)):
+                    index = rnd.randrange(width * height)
+                    layer[index] = 1 - layer[index] if rnd.random() < 0.5 else base[index]
+                for _ in range(2):
+                    dx, dy = rnd.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+                    if 0 <= goal_x + dx < width and 0 <= goal_y + dy < height \
+                            and layer[(goal_y + dy) * width + goal_x + dx]:
+                        goal_x, goal_y = goal_x + dx, goal_y + dy
+                if rnd.random() < 0.05:
+                    goal_x, goal_y = rnd.randrange(width), rnd.randrange(height)
+
+                found = planner.plan_layer((start_x, start_y), (goal_x, goal_y), layer, width, height)
+                distance = DistanceField(grid, (goal_x, goal_y), layer).distance(start_x, start_y)
+                self.assertEqual(found, distance is not None)
+                self.assertEqual(planner.distance(), distance)
+                if not found:
+                    if rnd.random() < 0.3:
+                        start = rnd.choice(free)
+                        start_x, start_y = start % width, start // width
+                    continue
+
+                path = planner.path()
+                self.assertEqual(len(path) - 1, distance)
+                self.assertEqual((path[0], path[-1]), ((start_x, start_y), (goal_x, goal_y)))
+                for (x, y), (next_x, next_y) in zip(path, path[1:]):
+                    self.assertEqual(abs(x - next_x) + abs(y - next_y), 1)
+                    self.assertTrue(layer[next_y * width + next_x])
+                next_position = planner.next_position()
+                if next_position is not None:
+                    start_x, start_y = next_position
+            # the point of the planner: most plans were repairs of the last one
+            self.assertGreater(planner.repairs, planner.full_searches)
+
+
+class RoomGraphTest(unittest.TestCase):
+    """
+    Checks RoomGraph's distances and paths against a breadth-first search (DistanceField) over the passability layer
+    of the same world.
+    """
+
+    def assert_matches_search(self, graph: RoomGraph, grid: Grid, layer: bytearray, rnd: random.Random,
+                              goals: int, starts: int) -> None:
+        width, height = grid.width, grid.height
+        for _ in range(goals):
+            goal = (rnd.randrange(width), rnd.randrange(height))
+            field = DistanceField(grid, goal, layer)
+            for _ in range(starts):
+                start = (rnd.randrange(width), rnd.randrange(height))
+                distance = graph.distance(start, goal)
+                self.assertEqual(distance, field.distance(*start), (start, goal))
+
+                path = graph.path(start, goal)
+                if distance is None:
+                    self.assertIsNone(path)
+                    continue
+                self.assertEqual(len(path) - 1, distance)
+                self.assertEqual((path[0], path[-1]), (start, goal))
+                for (x, y), (next_x, next_y) in zip(path, path[1:]):
+                    self.assertEqual(abs(x - next_x) + abs(y - next_y), 1)
+                    self.assertTrue(layer[next_y * width + next_x], (start, goal, path))
+
+    def test_gates(self):
+        for seed in (1, 2, 3):
+            world = build_game_board(seed)
+            grid = Grid(world)
+            avatars = world.get_objects(ObjectType.AVATAR)
+            avatar = avatars[next(iter(avatars))][0]
+            for game_object, allow_vents in ((None, True), (None, False), (avatar, True)):
+                graph = RoomGraph(world, game_object, allow_vents)
+                layer = bytearray(grid.passability(game_object, allow_vents))
+                rnd = random.Random(seed)
+                for round_number in range(6):
+                    if round_number:
+                        for gate in rnd.sample(graph.gates, min(5, len(graph.gates))):
+                            is_open = rnd.random() < 0.5
+                            graph.set_gate(gate % graph.width, gate // graph.width, is_open)
+                            layer[gate] = is_open
+                    self.assert_matches_search(graph, grid, layer, rnd, goals=20, starts=5)
+
+    def test_update_as_bots_move(self):
+        for seed in (1, 2):
+            game = Game(seed)
+            rnd = random.Random(seed)
+            graph = RoomGraph(snapshot(game.game_board))
+            while not game.done and game.tick < 200:
+                game.step([rnd.choice(MOVES), rnd.choice(MOVES)])
+                # what a client gets every turn: a new copy of the board
+                world = snapshot(game.game_board)
+                graph.update(world)
+                grid = Grid.of(world)
+                self.assert_matches_search(graph, grid, grid.passability(), rnd, goals=3, starts=5)
+
+
+class PathCacheTest(unittest.TestCase):
+    def test_evicts_the_path_used_longest_ago(self):
+        world = build_game_board(1)
+        grid = Grid.of(world)
+        layer = grid.passability()
+        free = [(x, y) for y in range(grid.height) for x in range(grid.width) if layer[y * grid.width + x]]
+        start, first, second, third = free[0], free[-1], free[len(free) // 2], free[len(free) // 3]
+
+        cache = PathCache(max_entries=2)
+        for goal in (first, second, first):
+            self.assertEqual(cache.path(start, goal, world), a_star_positions(start, goal, world))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 2, 0))
+
+        # second was used longest ago, since first was used again after it
+        cache.path(start, third, world)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual([key[1] for key in cache.entries], [first, third])
+        cache.path(start, first, world)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        cache.path(start, second, world)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 4, 2))
+        self.assertEqual([key[1] for key in cache.entries], [first, second])
+
+    def test_searches_again_once_the_path_is_blocked(self):
+        world = build_game_board(1)
+        start, goal = (1, 1), (36, 18)
+        cache = PathCache()
+        path = cache.path(start, goal, world)
+        self.assertEqual(path, a_star_positions(start, goal, world))
+        self.assertEqual(cache.path(start, goal, snapshot(world)), path)
+        self.assertEqual((cache.hits, cache.stale), (1, 0))
+
+        # next turn, a wall stands halfway along the cached path
+        blocked_world = snapshot(world)
+        for x, y in path[len(path) // 2:-1]:
+            if blocked_world.place(Vector(x, y), Wall()):
+                blocked = (x, y)
+                break
+        else:
+            self.fail('nowhere on the path to place a wall')
+
+        rerouted = cache.path(start, goal, blocked_world)
+        self.assertEqual(cache.stale, 1)
+        self.assertNotIn(blocked, rerouted)
+        self.assertEqual(rerouted, a_star_positions(start, goal, blocked_world))
+        self.assertEqual(cache.path(start, goal, blocked_world), rerouted)
+        self.assertEqual((cache.hits, cache.misses, cache.stale), (2, 2, 1))
+
+
+class TargetDistancesTest(unittest.TestCase):
+    """
+    Checks the distances and first moves of target_distances and nearest_target against a_star_positions on maps with
+    walls, one of them fencing a target in.
+    """
+
+    def assert_agrees_with_search(self, world, start, found, reached_from) -> None:
+        previous = 0
+        for target, (distance, move) in found.items():
+            paths = [path for path in (a_star_positions(start, tile, world) for tile in reached_from(target)) if path]
+            self.assertEqual(distance, min(len(path) - 1 for path in paths), target)
+            self.assertGreaterEqual(distance, previous)
+            previous = distance
+            if distance == 0:
+                self.assertIsNone(move)
+                continue
+            # ties can make the first step differ from A*'s, but it has to be on some shortest path
+            step = next(step for step, step_move in STEP_TO_MOVE.items() if step_move is move)
+            after = (start[0] + step[0], start[1] + step[1])
+            paths = [path for path in (a_star_positions(after, tile, world) for tile in reached_from(target)) if path]
+            self.assertEqual(min(len(path) - 1 for path in paths), distance - 1, target)
+
+    def test_distances_and_moves_match_search(self):
+        for seed in (1, 2):
+            world = build_game_board(seed)
+            grid = Grid.of(world)
+            layer = grid.passability()
+            free = [(x, y) for y in range(grid.height) for x in range(grid.width) if layer[y * grid.width + x]]
+            rnd = random.Random(seed)
+
+            # a tile fenced in by walls on every side can't be reached from anywhere
+            fenced = next((x, y) for x, y in rnd.sample(free, len(free))
+                          if 0 < x < grid.width - 1 and 0 < y < grid.height - 1)
+            for dx, dy in DIRECTIONS:
+                world.place(Vector(fenced[0] + dx, fenced[1] + dy), Wall())
+            Grid.invalidate()
+            layer = Grid.of(world).passability()
+            free = [tile for tile in free if layer[tile[1] * grid.width + tile[0]]]
+
+            for start in rnd.sample(free, 4):
+                targets = rnd.sample(free, 12) + [fenced, start]
+                reachable = {target for target in targets if a_star_positions(start, target, world) is not None}
+
+                found = target_distances(start, targets, world)
+                self.assertEqual(set(found), reachable)
+                self.assertNotIn(fenced, found)
+                self.assert_agrees_with_search(world, start, found, lambda target: [target])
+
+                nearest = nearest_target(start, targets, world)
+                self.assertEqual(nearest[:2], (start, 0))
+                others = [target for target in targets if target != start]
+                nearest = nearest_target(start, others, world)
+                self.assertEqual(nearest[1], min(found[target][0] for target in others if target in found))
+                self.assert_agrees_with_search(world, start, {nearest[0]: nearest[1:]}, lambda target: [target])
+
+                # used from a neighboring tile instead, like generators are
+                def neighbors(target):
+                    return [(target[0] + dx, target[1] + dy) for dx, dy in DIRECTIONS
+                            if 0 <= target[0] + dx < grid.width and 0 <= target[1] + dy < grid.height]
+
+                found = target_distances(start, others, world, adjacent=True)
+                self.assertEqual(set(found), {target for target in others if any(
+                    a_star_positions(start, tile, world) is not None for tile in neighbors(target))})
+                self.assertNotIn(fenced, found)
+                self.assert_agrees_with_search(world, start, found, neighbors)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+import ast
+import copy
+import json
+import os
+import random
+import tempfile
+import unittest
+
+# puts the engine from launcher.pyz on the path
+import batch
+from batch import build_game_board
+from turn_log import (INDEX_SUFFIX, TurnLogReader, TurnLogWriter, compact_coordinate_keys, diff,
+                      expand_coordinate_keys, patch)
+
+
+def make_ticks(count: int, seed: int = 0) -> list[dict]:
+    """
+    Ticks shaped like turn logs: a board keyed by position whose tiles change, appear and disappear, plus lists and
+    plain values that change every tick.
+    """
+    rng = random.Random(seed)
+    data = {'tick': 0, 'clients': [{'score': 0, 'actions': []}],
+            'game_board': {'seed': seed, 'map_size': {'x': 6, 'y': 6},
+                           'game_map': {f'{x},{y}': {'occupied_by': {'object_type': 9, 'charge': x * y}}
+                                        for x in range(6) for y in range(6)}}}
+    ticks = []
+    for tick in range(1, count + 1):
+        data['tick'] = tick
+        data['clients'][0]['score'] += rng.randrange(3)
+        data['clients'][0]['actions'] = [rng.randrange(10) for _ in range(rng.randrange(3))]
+        game_map = data['game_board']['game_map']
+        for _ in range(3):
+            key = f'{rng.randrange(6)},{rng.randrange(6)}'
+            change = rng.randrange(3)
+            if change == 0:
+                game_map.pop(key, None)
+            elif change == 1:
+                game_map[key] = {'occupied_by': {'object_type': 9, 'charge': rng.randrange(100)}}
+            elif key in game_map:
+                game_map[key]['occupied_by']['charge'] = rng.randrange(100)
+        # the writer serializes ticks later, so every tick is its own copy like the engine's turn logs are
+        ticks.append(copy.deepcopy(data))
+    return ticks
+
+
+def int_ids(data):
+    """
+    The JSON with its ids that are numbers as ints, the way turn logs are read back.
+    """
+    if isinstance(data, dict):
+        return {key: int(value) if key == 'id' and isinstance(value, str) and value.isdigit() else int_ids(value)
+                for key, value in data.items()}
+    if isinstance(data, list):
+        return [int_ids(value) for value in data]
+    return data
+
+
+class DiffTest(unittest.TestCase):
+    def test_patch_undoes_diff(self):
+        ticks = make_ticks(30)
+        for old, new in zip(ticks, ticks[1:]):
+            old_copy = copy.deepcopy(old)
+            self.assertEqual(patch(old, diff(old, new)), new)
+            self.assertEqual(old, old_copy)
+
+    def test_equal_dicts_give_an_empty_delta(self):
+        tick = make_ticks(1)[0]
+        self.assertEqual(diff(tick, copy.deepcopy(tick)), {})
+
+    def test_added_and_removed_keys(self):
+        old = {'a': 1, 'b': {'c': 2, 'd': [1, 2]}, 'e': 3}
+        new = {'a': 1, 'b': {'c': 4, 'd': [1]}, 'f': 5}
+        delta = diff(old, new)
+        self.assertEqual(delta, {'s': {'f': 5}, 'd': ['e'], 'p': {'b': {'s': {'c': 4, 'd': [1]}}}})
+        self.assertEqual(patch(old, delta), new)
+
+
+class TurnLogRoundTripTest(unittest.TestCase):
+    def assert_round_trip(self, compression: str, keyframe_interval: int):
+        ticks = make_ticks(30, seed=keyframe_interval)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'seed_1.jsonl')
+            with TurnLogWriter(path, compression, keyframe_interval=keyframe_interval) as writer:
+                for data in ticks:
+                    writer.write(data['tick'], data)
+
+            by_tick = {data['tick']: data for data in ticks}
+            in_order = list(by_tick)
+            backwards = in_order[::-1]
+            shuffled = in_order[:]
+            random.Random(0).shuffle(shuffled)
+
+            for order in (in_order, backwards, shuffled):
+                # a fresh reader per order, so each one starts without a cached tick
+                with TurnLogReader(path) as reader:
+                    self.assertEqual(reader.ticks, in_order)
+                    for tick in order:
+                        self.assertEqual(reader[tick], by_tick[tick], f'tick {tick}')
+                    # and reading the same tick twice in a row
+                    self.assertEqual(reader[order[-1]], by_tick[order[-1]])
+
+            with TurnLogReader(path) as reader:
+                self.assertEqual(list(reader), ticks)
+                with self.assertRaises(KeyError):
+                    reader[len(ticks) + 1]
+
+    def test_every_tick_a_keyframe(self):
+        for compression in ('none', 'gzip'):
+            with self.subTest(compression=compression):
+                self.assert_round_trip(compression, 1)
+
+    def test_deltas_between_keyframes(self):
+        for compression in ('none', 'gzip'):
+            with self.subTest(compression=compression):
+                self.assert_round_trip(compression, 7)
+
+
+class MissingIndexTest(unittest.TestCase):
+    def test_index_is_rebuilt_from_the_log(self):
+        ticks = make_ticks(30)
+        for compression in ('none', 'gzip'):
+            with self.subTest(compression=compression), tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'seed_1.jsonl')
+                with TurnLogWriter(path, compression, keyframe_interval=7) as writer:
+                    for data in ticks:
+                        writer.write(data['tick'], data)
+                os.remove(path + INDEX_SUFFIX)
+
+                with TurnLogReader(path) as reader:
+                    self.assertEqual(reader.compression, compression)
+                    self.assertEqual([list(entry[:3]) + [int(entry[3])] for entry in reader.entries], writer.index)
+                    self.assertEqual(list(reader), ticks)
+
+                # a tick cut off partway through being written is left out
+                with open(path, 'r+b') as f:
+                    f.truncate(writer.index[-1][1] + writer.index[-1][2] // 2)
+                with TurnLogReader(path) as reader:
+                    self.assertEqual(list(reader), ticks[:-1])
+
+
+class CoordinateKeysTest(unittest.TestCase):
+    def test_engine_board_round_trip(self):
+        board = build_game_board(1).to_json()
+        compact = compact_coordinate_keys(board)
+        for field in ('game_map', 'generators'):
+            vectors = [ast.literal_eval(key) for key in board[field]]
+            self.assertEqual(list(compact[field]), [f'{vector["x"]},{vector["y"]}' for vector in vectors])
+            self.assertEqual(list(compact[field].values()), list(board[field].values()))
+        self.assertEqual({key: value for key, value in compact.items() if key not in ('game_map', 'generators')},
+                         {key: value for key, value in board.items() if key not in ('game_map', 'generators')})
+
+        expanded = expand_coordinate_keys(compact)
+        for field in ('game_map', 'generators'):
+            # the Vectors' ids aren't kept, but everything else about them is
+            self.assertEqual([{**ast.literal_eval(key), 'id': None} for key in expanded[field]],
+                             [{**ast.literal_eval(key), 'id': None} for key in board[field]])
+            self.assertEqual(list(expanded[field].values()), list(board[field].values()))
+        self.assertEqual(compact_coordinate_keys(expanded), compact)
+
+        # converting a board that is already in the format asked for changes nothing
+        self.assertEqual(compact_coordinate_keys(compact), compact)
+        self.assertEqual(expand_coordinate_keys(board), board)
+
+    def test_reads_logs_written_before_keys_were_compact(self):
+        first = {'tick': 1, 'game_board': build_game_board(1).to_json()}
+        second = copy.deepcopy(first)
+        second['tick'] = 2
+        second['game_board']['event_active'] = not first['game_board']['event_active']
+        key = next(iter(second['game_board']['game_map']))
+        second['game_board']['game_map'][key] = {'changed': True}
+
+        with tempfile.TemporaryDirectory() as directory:
+            # written the way TurnLogWriter did before: the engine's keys, and no coordinate_keys in the index
+            path = os.path.join(directory, 'seed_1.jsonl')
+            lines = [json.dumps({'tick': 1, 'keyframe': first}).encode() + b'\n',
+                     json.dumps({'tick': 2, 'delta': diff(first, second)}).encode() + b'\n']
+            with open(path, 'wb') as f:
+                f.write(b''.join(lines))
+            with open(path + INDEX_SUFFIX, 'w') as f:
+                json.dump({'compression': 'none', 'keyframe_interval': 25, 'results': None,
+                           'ticks': [[1, 0, len(lines[0]), 1], [2, len(lines[0]), len(lines[1]), 0]]}, f)
+
+            with TurnLogReader(path) as reader:
+                self.assertFalse(reader.compact_keys)
+                for expected in (first, second):
+                    data = reader[expected['tick']]
+                    self.assertEqual(data, int_ids({**expected,
+                                                    'game_board': compact_coordinate_keys(expected['game_board'])}))
+                    self.assertNotIn(key, data['game_board']['game_map'])
+
+                reader.export(os.path.join(directory, 'turns'))
+            with open(os.path.join(directory, 'turns', 'turn_0002.json')) as f:
+                exported = json.load(f)
+            self.assertEqual(exported['game_board']['game_map'],
+                             expand_coordinate_keys(compact_coordinate_keys(second['game_board']))['game_map'])
+
+
+class IdsTest(unittest.TestCase):
+    def test_ids_are_written_as_numbers(self):
+        ticks = make_ticks(10)
+        client_id = '3f0c1a52-9d4e-4f0b-8c55-0c1b4e1f2a77'
+        for data in ticks:
+            data['clients'][0]['id'] = client_id
+            data['clients'][0]['avatar'] = {'id': str(2714 + data['tick']), 'position': {'id': '7', 'x': 1, 'y': 1}}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'seed_1.jsonl')
+            with TurnLogWriter(path, keyframe_interval=4) as writer:
+                for data in ticks:
+                    writer.write(data['tick'], data)
+            with open(path) as f:
+                self.assertIn('"id":2715', f.readline())
+
+            with TurnLogReader(path) as reader:
+                self.assertEqual(list(reader), [int_ids(data) for data in ticks])
+                self.assertEqual(reader[3]['clients'][0]['id'], client_id)
+                self.assertEqual(reader[3]['clients'][0]['avatar']['id'], 2717)
+
+                # the visualizer gets the engine's string ids back
+                reader.export(os.path.join(directory, 'turns'))
+            with open(os.path.join(directory, 'turns', 'turn_0003.json')) as f:
+                self.assertEqual(json.load(f), {**ticks[2],
+                                                'game_board': expand_coordinate_keys(ticks[2]['game_board'])})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,439 @@
+import argparse
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import zlib
+from typing import Any, Iterator
+
+try:
+    import zstandard
+except ImportError:
+    # only needed for zstd compressed logs
+    zstandard = None
+
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+INDEX_SUFFIX = '.index.json'
+DEFAULT_KEYFRAME_INTERVAL = 25
+
+# the parts of the game board keyed by position
+COORDINATE_KEYED = ('game_map', 'generators')
+# the engine keys them by a stringified Vector: "{'id': ..., 'object_type': 6, ..., 'x': 1, 'y': 2}"
+VECTOR_KEY = re.compile(r"'x': (-?\d+), 'y': (-?\d+)}$")
+VECTOR_OBJECT_TYPE = 6  # ObjectType.VECTOR
+
+# ids that are numbers are written as numbers; the engine's ids are counted (see batch.GameIds) but are strings.
+# Only ids that come back out as the same string are matched, and the uuids of a client's objects stay strings.
+STRING_ID = re.compile(rb'"id": ?"([1-9][0-9]*)"')
+# the same ids in the JSON export writes for the visualizer
+NUMBER_ID = re.compile(r'"id": ([0-9]+)')
+
+# every line starts with the tick and whether it's a keyframe, in the order TurnLogWriter writes them
+ENTRY_START = re.compile(rb'\{"tick":(-?\d+),"(keyframe|delta)"')
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+SCAN_CHUNK_SIZE = 1 << 16
+
+
+def _check_compression(compression: str) -> None:
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'compression must be one of {COMPRESSIONS}. It is {compression}.')
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError('zstd compressed turn logs need the zstandard package (pip install zstandard)')
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def _scan_member(data: memoryview, offset: int, compression: str) -> tuple[bytes, int]:
+    """
+    Reads the line at ``offset`` of a log's raw bytes.
+    :return: the decompressed line and how many bytes of ``data`` it took up
+    :raises EOFError: if the file ends before the line does
+    """
+    if compression == 'none':
+        end = data.obj.find(b'\n', offset)
+        if end == -1:
+            raise EOFError
+        return bytes(data[offset:end + 1]), end + 1 - offset
+
+    decompressor = (zlib.decompressobj(wbits=zlib.MAX_WBITS | 16) if compression == 'gzip'
+                    else zstandard.ZstdDecompressor().decompressobj())
+    # fed in chunks so a member near the start doesn't copy the whole rest of the file
+    parts = []
+    position = offset
+    while not decompressor.eof:
+        if position >= len(data):
+            raise EOFError
+        chunk = data[position:position + SCAN_CHUNK_SIZE]
+        parts.append(decompressor.decompress(chunk))
+        position += len(chunk)
+    return b''.join(parts), position - offset - len(decompressor.unused_data)
+
+
+def scan_index(path: str) -> dict:
+    """
+    Rebuilds the index ``TurnLogWriter.close`` writes by reading the log itself, for logs whose writer never got to
+    close it (the game's process was killed, for instance). A tick cut off partway through ends the scan. The results
+    of the game aren't in the log, so they're left out.
+    """
+    with open(path, 'rb') as f:
+        data = memoryview(f.read())
+
+    compression = 'none'
+    if data[:len(GZIP_MAGIC)] == GZIP_MAGIC:
+        compression = 'gzip'
+    elif data[:len(ZSTD_MAGIC)] == ZSTD_MAGIC:
+        compression = 'zstd'
+    _check_compression(compression)
+
+    ticks = []
+    offset = 0
+    while offset < len(data):
+        try:
+            line, length = _scan_member(data, offset, compression)
+        except (EOFError, zlib.error):
+            break
+        match = ENTRY_START.match(line)
+        if match is None or not line.endswith(b'\n'):
+            break
+        ticks.append([int(match[1]), offset, length, int(match[2] == b'keyframe')])
+        offset += length
+    # without 'coordinate_keys' and 'ids', the reader converts the keys and ids itself in case the log is older
+    return {'compression': compression, 'ticks': ticks, 'results': None}
+
+
+def coordinate_key(x: int, y: int) -> str:
+    return f'{x},{y}'
+
+
+def compact_coordinate_keys(game_board: dict) -> dict:
+    """
+    Returns the game board JSON with its positions keyed by ``coordinate_key`` instead of a stringified Vector. Boards
+    that are already compact are returned as they are.
+    """
+    converted = dict(game_board)
+    for field in COORDINATE_KEYED:
+        keyed: dict | None = game_board.get(field)
+        if not keyed or not next(iter(keyed)).startswith('{'):
+            continue
+        compact = {}
+        for key, value in keyed.items():
+            x, y = VECTOR_KEY.search(key).groups()
+            compact[coordinate_key(int(x), int(y))] = value
+        converted[field] = compact
+    return converted
+
+
+def expand_coordinate_keys(game_board: dict) -> dict:
+    """
+    Returns the game board JSON with its positions keyed by a stringified Vector again, the way the engine writes it
+    and the visualizer reads it. The Vectors get their position as their id, since the original ids aren't kept.
+    """
+    converted = dict(game_board)
+    for field in COORDINATE_KEYED:
+        keyed: dict | None = game_board.get(field)
+        if not keyed or next(iter(keyed)).startswith('{'):
+            continue
+        expanded = {}
+        for key, value in keyed.items():
+            x, y = key.split(',')
+            vector = {'id': key, 'object_type': VECTOR_OBJECT_TYPE, 'state': 'idle', '__class__': 'Vector',
+                      'x': int(x), 'y': int(y)}
+            expanded[str(vector)] = value
+        converted[field] = expanded
+    return converted
+
+
+def _compact_tick(data: dict) -> dict:
+    if 'game_board' not in data:
+        return data
+    return {**data, 'game_board': compact_coordinate_keys(data['game_board'])}
+
+
+def diff(old: dict, new: dict) -> dict:
+    """
+    Returns the changes that turn ``old`` into ``new``:
+        - 's': keys that were added or whose value was replaced, with their new value
+        - 'd': keys that were removed
+        - 'p': keys holding a dict on both sides, with the nested changes for that dict
+
+    Parts with nothing in them are left out, so equal dicts give an empty delta. Lists are never diffed; a list that
+    changed at all is replaced.
+    """
+    delta: dict = {}
+    replaced: dict = {}
+    patched: dict = {}
+
+    for key, value in new.items():
+        if key not in old:
+            replaced[key] = value
+            continue
+
+        old_value = old[key]
+        if old_value == value:
+            continue
+
+        if isinstance(old_value, dict) and isinstance(value, dict):
+            patched[key] = diff(old_value, value)
+        else:
+            replaced[key] = value
+
+    removed = [key for key in old if key not in new]
+
+    if replaced:
+        delta['s'] = replaced
+    if removed:
+        delta['d'] = removed
+    if patched:
+        delta['p'] = patched
+    return delta
+
+
+def patch(old: dict, delta: dict) -> dict:
+    """
+    Applies a delta made by ``diff`` and returns the result. ``old`` isn't changed; only the dicts along changed paths
+    are copied, so the result shares everything that didn't change with ``old``.
+    """
+    new = dict(old)
+    for key in delta.get('d', ()):
+        del new[key]
+    new.update(delta.get('s', {}))
+    for key, nested in delta.get('p', {}).items():
+        new[key] = patch(old[key], nested)
+    return new
+
+
+class TurnLogWriter:
+    """
+    `Turn Log Writer Notes:`
+
+        Streams every tick of a game into a single append-only JSON Lines file. Ticks are handed over with ``write``
+        and serialized by one background thread; the queue between them is bounded, so a slow disk holds the game
+        back instead of piling up ticks in memory.
+
+        Every ``keyframe_interval`` ticks (and on the first tick) the whole turn log is written as a keyframe. The
+        ticks in between only store what changed since the tick before them (see ``diff``), which leaves out the
+        walls, vents and everything else that never changes. A keyframe interval of 1 writes every tick in full.
+
+        The positions on the game board are keyed by ``coordinate_key`` ("x,y"). Ticks given in the engine's format,
+        keyed by stringified Vectors, are converted before they are written. Apart from being shorter, these keys don't
+        change from one tick to the next like the ids inside the Vector keys do, so the deltas stay small.
+
+        Ids that are numbers are written as JSON numbers instead of strings ("id":2714 rather than "id":"2714"), by
+        rewriting each serialized line, so reading a log back gives int ids.
+
+        When the log is compressed, every line is compressed on its own (one gzip member or zstd frame per tick).
+        The file is still a normal .gz/.zst file, but any tick can be decompressed without reading the ones before
+        it.
+
+        ``close`` flushes the remaining ticks, joins the thread, and writes the index: the byte offset and length of
+        every tick and whether it is a keyframe, stored next to the log as ``<path>.index.json``. The results of the
+        game can be stored in the index too.
+    """
+
+    def __init__(self, path: str, compression: str = 'none', max_queued_ticks: int = 64,
+                 keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        _check_compression(compression)
+        if keyframe_interval < 1:
+            raise ValueError(f'keyframe_interval must be at least 1. It is {keyframe_interval}.')
+
+        self.path: str = path
+        self.compression: str = compression
+        self.keyframe_interval: int = keyframe_interval
+        self.index: list[list[int]] = []
+        self.error: BaseException | None = None
+
+        self.__file = open(path, 'wb')
+        self.__queue: queue.Queue[tuple[int, dict] | None] = queue.Queue(maxsize=max_queued_ticks)
+        self.__thread = threading.Thread(target=self.__run, name='TurnLogWriter', daemon=True)
+        self.__closed = False
+        self.__thread.start()
+
+    def write(self, tick: int, data: dict) -> None:
+        """
+        Queues a tick to be written. ``data`` must not be changed afterward since it is serialized later on the writer
+        thread; turn logs are built fresh every tick, so this is never a problem for them.
+        """
+        if self.__closed:
+            raise RuntimeError('Cannot write to a closed turn log')
+        self.__queue.put((tick, data))
+
+    def close(self, results: dict | None = None) -> None:
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__file.close()
+
+        with open(self.path + INDEX_SUFFIX, 'w') as f:
+            json.dump({'compression': self.compression, 'keyframe_interval': self.keyframe_interval,
+                       'coordinate_keys': 'compact', 'ids': 'int', 'ticks': self.index, 'results': results}, f)
+
+        if self.error is not None:
+            raise self.error
+
+    def __run(self) -> None:
+        offset = 0
+        previous: dict | None = None
+        while (item := self.__queue.get()) is not None:
+            # keep draining after an error so write() never blocks on a full queue; close() raises it
+            if self.error is not None:
+                continue
+
+            tick, data = item
+            keyframe = previous is None or len(self.index) % self.keyframe_interval == 0
+            try:
+                data = _compact_tick(data)
+                entry = {'tick': tick, 'keyframe': data} if keyframe else {'tick': tick, 'delta': diff(previous, data)}
+                line = STRING_ID.sub(rb'"id":\1', json.dumps(entry, separators=(',', ':')).encode()) + b'\n'
+                line = _compress(line, self.compression)
+                self.__file.write(line)
+            except BaseException as e:
+                self.error = e
+                continue
+
+            self.index.append([tick, offset, len(line), int(keyframe)])
+            offset += len(line)
+            previous = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TurnLogReader:
+    """
+    `Turn Log Reader Notes:`
+
+        Reads ticks back out of a log written by TurnLogWriter. The index is loaded up front, so looking up a tick only
+        reads the keyframe at or before it and the deltas up to it, never the rest of the file.
+
+        The last tick rebuilt is remembered, so reading ticks in order (or iterating) applies each delta only once.
+        Ticks that are returned share unchanged parts with each other; copy one before changing it.
+
+        A log without its index (its writer was never closed) is scanned once to rebuild it (see ``scan_index``);
+        every complete tick in it can be read as usual.
+
+        Ticks always come back with compact "x,y" position keys and int ids, including from logs written before
+        either; ``export`` writes the engine's keys and string ids back out for the visualizer.
+    """
+
+    def __init__(self, path: str):
+        index: dict[str, Any]
+        if os.path.exists(path + INDEX_SUFFIX):
+            with open(path + INDEX_SUFFIX) as f:
+                index = json.load(f)
+        else:
+            index = scan_index(path)
+
+        self.compression: str = index['compression']
+        _check_compression(self.compression)
+        self.results: dict | None = index.get('results')
+        self.compact_keys: bool = index.get('coordinate_keys') == 'compact'
+        self.int_ids: bool = index.get('ids') == 'int'
+
+        # (tick, offset, length, is_keyframe) in the order they were written
+        self.entries: list[tuple[int, int, int, bool]] = [(tick, offset, length, bool(keyframe))
+                                                          for tick, offset, length, keyframe in index['ticks']]
+        self.positions: dict[int, int] = {entry[0]: i for i, entry in enumerate(self.entries)}
+        self.__file = open(path, 'rb')
+        self.__cached: tuple[int, dict] | None = None
+
+    @property
+    def ticks(self) -> list[int]:
+        return [entry[0] for entry in self.entries]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __read_entry(self, position: int) -> dict:
+        tick, offset, length, keyframe = self.entries[position]
+        self.__file.seek(offset)
+        line = _decompress(self.__file.read(length), self.compression)
+        if not self.int_ids:
+            line = STRING_ID.sub(rb'"id":\1', line)
+        return json.loads(line)
+
+    def __getitem__(self, tick: int) -> dict:
+        if tick not in self.positions:
+            raise KeyError(f'tick {tick} is not in this turn log')
+        target = self.positions[tick]
+
+        # start from the closest keyframe, unless the tick rebuilt last time is between it and the target
+        start = target
+        while not self.entries[start][3]:
+            start -= 1
+
+        if self.__cached is not None and start <= self.__cached[0] <= target:
+            position, data = self.__cached
+        else:
+            position, data = start, self.__read_entry(start)['keyframe']
+
+        while position < target:
+            position += 1
+            data = patch(data, self.__read_entry(position)['delta'])
+
+        self.__cached = (position, data)
+        return data if self.compact_keys else _compact_tick(data)
+
+    def __iter__(self) -> Iterator[dict]:
+        for tick in self.ticks:
+            yield self[tick]
+
+    def export(self, out_dir: str) -> None:
+        """
+        Writes the log out as ``turn_XXXX.json`` files (and ``results.json`` if the results were saved), the layout the
+        launcher writes to ``logs``. ``python launcher.pyz visualize -log <out_dir>`` can then play it back.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        for tick in self.ticks:
+            data = self[tick]
+            if 'game_board' in data:
+                data = {**data, 'game_board': expand_coordinate_keys(data['game_board'])}
+            with open(os.path.join(out_dir, f'turn_{tick:04d}.json'), 'w') as f:
+                f.write(NUMBER_ID.sub(r'"id": "\1"', json.dumps(data)))
+
+        if self.results is not None:
+            with open(os.path.join(out_dir, 'results.json'), 'w') as f:
+                json.dump(self.results, f)
+
+    def close(self) -> None:
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == '__main__':
+    par = argparse.ArgumentParser(description='Converts a streamed turn log back into one file per turn')
+
+    par.add_argument('log', action='store', type=str, help='Path to the turn log')
+
+    par.add_argument('out_dir', action='store', type=str, help='Directory to write the turn_XXXX.json files to')
+
+    par_args = par.parse_args()
+
+    with TurnLogReader(par_args.log) as reader:
+        reader.export(par_args.out_dir)
@@ -0,0 +1,216 @@
+from typing import Iterable
+
+import numpy as np
+
+# batch puts the engine from launcher.pyz on the path, so it has to be imported before anything from `game`
+from batch import BatchMasterController, build_game_board, get_global_state, set_global_state
+from game.common.avatar import Avatar
+from game.common.enums import ActionType, ObjectType, BOT_OBJECT_TYPES
+from game.common.map.game_board import GameBoard
+from game.common.player import Player
+from game.config import MAX_NUMBER_OF_ACTIONS_PER_TURN, MAX_TICKS
+
+# the layers of the grid observation, in order; every bot type shares the last one
+GRID_LAYERS: tuple[ObjectType, ...] = (
+    ObjectType.WALL,
+    ObjectType.VENT,
+    ObjectType.DOOR,
+    ObjectType.REFUGE,
+    ObjectType.GENERATOR,
+    ObjectType.BATTERY_SPAWNER,
+    ObjectType.SCRAP_SPAWNER,
+    ObjectType.COIN_SPAWNER,
+    ObjectType.AVATAR,
+    ObjectType.BOT,
+)
+LAYER_INDEX: dict[ObjectType, int] = {object_type: i for i, object_type in enumerate(GRID_LAYERS)}
+LAYER_INDEX.update({object_type: LAYER_INDEX[ObjectType.BOT] for object_type in BOT_OBJECT_TYPES})
+
+# the order of the bots in the bot position observation
+BOT_ORDER: tuple[ObjectType, ...] = (
+    ObjectType.CRAWLER_BOT,
+    ObjectType.DUMB_BOT,
+    ObjectType.IAN_BOT,
+    ObjectType.JUMPER_BOT,
+    ObjectType.SUPPORT_BOT,
+)
+
+# the columns of the avatar observation, in order
+AVATAR_FIELDS: tuple[str, ...] = ('x', 'y', 'power', 'health', 'score')
+
+
+class Game:
+    """
+    `Game Notes:`
+
+        One game stepped directly through ``MasterController.turn_logic``, without an engine or a client. The actions
+        of each turn are given to ``step`` instead of coming from a client's ``take_turn``.
+
+        The engine keeps some of the game's state at the class level (on Bot and Refuge) and in ``random``, which every
+        game in the process shares. Each Game keeps its own copy of that state (see ``get_global_state``) and puts it
+        in place while it steps, so any number of games can be stepped in turn in the same process.
+
+        Turn logs are never created. Creating them only changes what the visualizer shows, not how the game plays.
+    """
+
+    def __init__(self, seed: int):
+        self.seed: int = seed
+        self.world: dict = {'game_board': build_game_board(seed)}
+        self.master_controller: BatchMasterController = BatchMasterController()
+        self.player: Player = Player(team_name='VecEnv')
+        self.master_controller.give_clients_objects([self.player], self.world)
+        self.tick: int = 0
+        # caches the bots without seeding random, which only happens on the first turn
+        self.master_controller.interpret_current_turn_data([self.player], self.world, self.tick)
+        self.global_state: dict = get_global_state()
+
+    @property
+    def game_board(self) -> GameBoard:
+        return self.world['game_board']
+
+    @property
+    def avatar(self) -> Avatar:
+        return self.player.avatar
+
+    @property
+    def done(self) -> bool:
+        return self.master_controller.game_over or self.tick >= MAX_TICKS
+
+    def step(self, actions: list[ActionType]) -> int:
+        """
+        Plays one turn with the given actions.
+        :return: the points awarded this turn
+        """
+        set_global_state(self.global_state)
+        self.tick += 1
+        self.master_controller.turn = self.tick
+        self.master_controller.interpret_current_turn_data([self.player], self.world, self.tick)
+        self.player.actions = list(actions)[:MAX_NUMBER_OF_ACTIONS_PER_TURN]
+        self.master_controller.turn_logic([self.player], self.tick)
+        self.global_state = get_global_state()
+        return self.master_controller.point_data.point_award
+
+    def observe_grid(self, out: np.ndarray) -> None:
+        """
+        Fills ``out`` (layers × height × width) with the grid observation: 1 where an object of the layer's type is.
+        Doors are 2 when they are open, and spawners are 2 when they have something to pick up.
+        """
+        out.fill(0)
+        for position, container in self.game_board.game_map.items():
+            for game_object in container:
+                layer = LAYER_INDEX.get(game_object.object_type)
+                if layer is None:
+                    continue
+
+                value = 1
+                if getattr(game_object, 'open', False) or getattr(game_object, 'is_available', False):
+                    value = 2
+                out[layer, position.y, position.x] = value
+
+    def observe_avatar(self, out: np.ndarray) -> None:
+        avatar = self.avatar
+        out[:] = (avatar.position.x, avatar.position.y, avatar.power, avatar.health, avatar.score)
+
+    def observe_bots(self, out: np.ndarray) -> None:
+        """
+        Fills ``out`` (bots × 2) with the x and y of every bot in BOT_ORDER, or -1 for bots this map doesn't have.
+        """
+        out.fill(-1)
+        for i, object_type in enumerate(BOT_ORDER):
+            bot = self.master_controller.bots.get(object_type)
+            if bot is not None:
+                out[i] = (bot.position.x, bot.position.y)
+
+
+class VecEnv:
+    """
+    `Vec Env Notes:`
+
+        Steps many independent games in lockstep from one process for tuning bots and parameter searches. ``step``
+        takes one list of actions per game and returns NumPy arrays covering every game at once:
+
+            - observations: a dict with
+                - 'grid': uint8 (games × len(GRID_LAYERS) × height × width), see ``Game.observe_grid``
+                - 'avatar': float32 (games × len(AVATAR_FIELDS)), the avatar's x, y, power, health and score
+                - 'bots': int16 (games × len(BOT_ORDER) × 2), see ``Game.observe_bots``
+            - rewards: float32 (games), the points each game awarded that turn (``PointData.point_award``)
+            - dones: bool (games), whether each game ended that turn
+
+        A game that ends is replaced right away by a new one with the next seed from the seed pool, which is used
+        round-robin. Its observation is then the first one of the new game, and the info returned for it has the
+        seed, ticks and final score of the game that ended.
+
+        All games are played on the same map, so every observation has the same shape.
+    """
+
+    def __init__(self, num_games: int, seeds: Iterable[int]):
+        self.seeds: list[int] = list(seeds)
+        if num_games < 1:
+            raise ValueError(f'num_games must be at least 1. It is {num_games}.')
+        if not self.seeds:
+            raise ValueError('The seed pool must have at least one seed.')
+
+        self.num_games: int = num_games
+        self.__next_seed: int = 0
+        self.games: list[Game] = []
+
+        self.grid: np.ndarray | None = None
+        self.avatar: np.ndarray = np.zeros((num_games, len(AVATAR_FIELDS)), dtype=np.float32)
+        self.bots: np.ndarray = np.zeros((num_games, len(BOT_ORDER), 2), dtype=np.int16)
+
+    def __new_game(self) -> Game:
+        seed = self.seeds[self.__next_seed % len(self.seeds)]
+        self.__next_seed += 1
+        return Game(seed)
+
+    def __observe(self, i: int) -> None:
+        game = self.games[i]
+        game.observe_grid(self.grid[i])
+        game.observe_avatar(self.avatar[i])
+        game.observe_bots(self.bots[i])
+
+    def __observations(self) -> dict[str, np.ndarray]:
+        # copies, so the caller can keep them around across steps
+        return {'grid': self.grid.copy(), 'avatar': self.avatar.copy(), 'bots': self.bots.copy()}
+
+    def reset(self) -> dict[str, np.ndarray]:
+        """
+        Starts a new game in every slot.
+        :return: the first observations of every game
+        """
+        self.games = [self.__new_game() for _ in range(self.num_games)]
+        map_size = self.games[0].game_board.map_size
+        self.grid = np.zeros((self.num_games, len(GRID_LAYERS), map_size.y, map_size.x), dtype=np.uint8)
+        for i in range(self.num_games):
+            self.__observe(i)
+        return self.__observations()
+
+    def step(self, actions: list[list[ActionType]]) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray,
+                                                             list[dict]]:
+        """
+        Plays one turn of every game.
+        :param actions: one list of actions per game
+        :return: the observations, rewards, done flags and infos of every game
+        """
+        if not self.games:
+            raise RuntimeError('reset must be called before step')
+        if len(actions) != self.num_games:
+            raise ValueError(f'Expected actions for {self.num_games} games, but got {len(actions)}.')
+
+        rewards = np.zeros(self.num_games, dtype=np.float32)
+        dones = np.zeros(self.num_games, dtype=bool)
+        infos: list[dict] = []
+
+        for i, (game, game_actions) in enumerate(zip(self.games, actions)):
+            rewards[i] = game.step(game_actions)
+            info = {'seed': game.seed, 'tick': game.tick}
+
+            if game.done:
+                dones[i] = True
+                info['final_score'] = game.avatar.score
+                self.games[i] = self.__new_game()
+
+            infos.append(info)
+            self.__observe(i)
+
+        return self.__observations(), rewards, dones, infos